@@ -0,0 +1,114 @@
+"""
+Benchmarks the on_message command pre-filter.
+
+"before" is the old hot path: every message pays for a blocked check and a prefix scan (what ``get_context`` does).
+"after" rejects messages with a compiled :class:`kmn.matcher.PrefixMatcher` first, so only messages that look like
+commands reach the blocked check. Backend round trips are simulated with ``asyncio.sleep``.
+
+Usage: python -m benchmarks.message_filter [--messages N] [--command-ratio R] [--rtt SECONDS]
+"""
+
+import argparse
+import asyncio
+import random
+import string
+import time
+
+from kmn.cache import LRUCache
+from kmn.matcher import PrefixMatcher
+
+PREFIXES = ['k?', 'kmn ', '!!', '<@1234567890> ', '<@!1234567890> ']
+
+
+class FakeBot:
+    def __init__(self, rtt):
+        self.rtt = rtt
+        self.blocked_cache = LRUCache('blocked', max_size=10000, ttl=600)
+        self.matcher = PrefixMatcher(PREFIXES, source=PREFIXES)
+
+    async def is_blocked(self, author_id):
+        blocked = self.blocked_cache.get(author_id)
+        if blocked is not None:
+            return blocked
+
+        # redis round trip
+        await asyncio.sleep(self.rtt)
+        self.blocked_cache.put(author_id, False)
+        return False
+
+    @staticmethod
+    def resolve_prefix(content):
+        # what discord.py does for a list of prefixes
+        for prefix in PREFIXES:
+            if content.startswith(prefix):
+                return prefix
+        return None
+
+    async def before(self, author_id, content):
+        if await self.is_blocked(author_id):
+            return
+        self.resolve_prefix(content)
+
+    async def after(self, author_id, content):
+        if not self.matcher.matches(content):
+            return
+        if await self.is_blocked(author_id):
+            return
+        self.resolve_prefix(content)
+
+
+def make_messages(count, command_ratio, authors):
+    def chatter():
+        return ' '.join(''.join(random.choices(string.ascii_lowercase, k=random.randint(1, 9)))
+                        for _ in range(random.randint(1, 12)))
+
+    messages = []
+    for _ in range(count):
+        content = chatter()
+        if random.random() < command_ratio:
+            content = random.choice(PREFIXES) + content
+        messages.append((random.randrange(authors), content))
+    return messages
+
+
+async def run(handler, messages, concurrency):
+    # keep up to ``concurrency`` messages in flight, like the gateway does
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def process(message):
+        try:
+            await handler(*message)
+        finally:
+            semaphore.release()
+
+    started = time.perf_counter()
+    tasks = []
+    for message in messages:
+        await semaphore.acquire()
+        tasks.append(asyncio.ensure_future(process(message)))
+    await asyncio.gather(*tasks)
+    return len(messages) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmarks the on_message command pre-filter')
+    parser.add_argument('--messages', type=int, default=200000)
+    parser.add_argument('--command-ratio', type=float, default=0.05)
+    parser.add_argument('--authors', type=int, default=50000)
+    parser.add_argument('--rtt', type=float, default=0.0005, help='simulated redis round trip, in seconds')
+    parser.add_argument('--concurrency', type=int, default=10)
+    args = parser.parse_args()
+
+    random.seed(0)
+    messages = make_messages(args.messages, args.command_ratio, args.authors)
+    loop = asyncio.get_event_loop()
+
+    for name in ('before', 'after'):
+        bot = FakeBot(args.rtt)
+        rate = loop.run_until_complete(run(getattr(bot, name), messages, args.concurrency))
+        print(f'{name:>6}: {rate:>12,.0f} messages/s  (blocked cache: {bot.blocked_cache.hits} hits, '
+              f'{bot.blocked_cache.misses} misses)')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,126 +1,640 @@
+import asyncio
+import importlib
 import json
 import logging
+import math
+import os
+import socket
+import time
 from pathlib import Path
 
-from discord import Message, Guild
+from discord import Message, Guild, Member, Object
 from discord.ext.commands import Bot as DiscordBot
 
+from kmn.breaker import BackendUnavailable, CircuitBreaker
+from kmn.cache import LRUCache
+from kmn.checks import has_priority
+from kmn.command_stats import CommandStatsRegistry
 from kmn.context import Context
+from kmn.control import ControlPlane
 from kmn.formatter import Formatter
+from kmn.guild_config import GUILD_KEY
+from kmn.invalidation import Invalidator
+from kmn.lazy import LAZY_COGS, make_stub
+from kmn.loop_monitor import LagSampler, StallDetector
+from kmn.lookup import Lookup
+from kmn.members import MemberCachePolicy, MemberFetcher
+from kmn.matcher import PrefixMatcher
+from kmn.metrics import Metrics
+from kmn.outgoing import OutgoingMessages
+from kmn.pipeline import MessagePipeline, MessageState
+from kmn.postgres import Postgres, is_failure as is_postgres_failure
+from kmn.preflight import PREFLIGHT_CONFIG_KEYS, Preflight
+from kmn.redis import PipelinedRedis, is_failure as is_redis_failure
+from kmn.reloader import Reloader
+from kmn.responses import ResponseCache
+from kmn.scheduler import CommandScheduler
+from kmn.shedding import LoadShedder
+from kmn.snapshot import Snapshot
+from kmn.startup import StartupTimings
 from kmn.storage import JSONStorage
+from kmn.tracing import Tracer, traced_http
 
 log = logging.getLogger(__name__)
 DESCRIPTION = """a super neat bot by slice#4274"""
 BLOCKED_KEY = 'kmn:core:cache:blocked:{0.id}'
 PREFIXES_KEY = 'kmn:core:prefixes:{0.id}'
 
+# used when the config doesn't have any. shared so that it's the same list every time (see could_be_command)
+DEFAULT_PREFIXES = ['k?']
+
+# how long blocked statuses are cached for, both in redis and in-process
+BLOCKED_TTL = 60 * 10  # 10 minutes
+
+# prefixes are invalidated explicitly, this is only a safety net
+PREFIXES_TTL = 60 * 60  # 1 hour
+
+# guild configuration changes made through the bot are invalidated, but it can also be edited by hand
+GUILD_CONFIG_TTL = 60 * 5  # 5 minutes
+
 
 async def prefix_handler(bot: 'Bot', msg: Message):
     await bot.wait_until_ready()
 
-    mention_prefixes = [f'<@{bot.user.id}> ', f'<@!{bot.user.id}> ']
-
     if not msg.guild:
-        return bot.default_prefixes + mention_prefixes
+        return bot.default_prefixes + bot.mention_prefixes
 
     prefixes = await bot.get_prefixes_for(msg.guild)
-    return mention_prefixes + prefixes
+    return bot.mention_prefixes + prefixes
 
 
 class Bot(DiscordBot):
-    def __init__(self, *, config, postgres, redis):
+    def __init__(self, *, config, postgres, redis, startup: StartupTimings = None, snapshot_path: str = None,
+                 **options):
+        # which members (and how much of their presences) get cached, see kmn.members
+        member_policy = MemberCachePolicy(**config.get('member_cache', {}))
+
         super().__init__(
             command_prefix=prefix_handler,
             pm_help=None,
             formatter=Formatter(),
-            description=DESCRIPTION
+            description=DESCRIPTION,
+            fetch_offline_members=member_policy.fetch_offline_members,
+            **options
         )
 
+        self.member_policy = member_policy
+        self.member_policy.install(self._connection)
+
         # whoops, my hand slipped
         self.all_commands['help'].help = 'shows some help'
 
         # store config
         self.config = config
 
+        # how long each stage of startup took
+        self.startup = startup or StartupTimings()
+
         # blocked users
         self.blocked = JSONStorage('_blocked.json', loop=self.loop)
 
+        # latency histograms
+        self.metrics = Metrics()
+
+        # sampled traces of command invocations
+        self.tracer = Tracer(loop=self.loop, **self.config.get('tracing', {}))
+        if self.tracer.enabled:
+            self.http.request = traced_http(self.tracer, self.http.request)
+
+        # backends fail fast while they're down, instead of piling up stuck coroutines
+        breakers = self.config.get('breakers', {})
+        self.breakers = [
+            CircuitBreaker('postgres', is_failure=is_postgres_failure, **breakers.get('postgres', {})),
+            CircuitBreaker('redis', is_failure=is_redis_failure, **breakers.get('redis', {}))
+        ]
+
+        # outgoing messages, queued per channel
+        self.outgoing = OutgoingMessages(loop=self.loop, metrics=self.metrics, **self.config.get('outgoing', {}))
+
         # postgres pool
-        self.postgres = postgres
-        self.redis = redis
+        self.postgres = Postgres(
+            postgres, metrics=self.metrics, tracer=self.tracer, breaker=self.breakers[0],
+            query_timeout=self.config.get('query_timeout', 10.0)
+        )
+
+        # redis pool, with commands automatically pipelined
+        self.redis = PipelinedRedis(
+            redis, loop=self.loop, metrics=self.metrics, tracer=self.tracer, breaker=self.breakers[1]
+        )
+
+        # background tasks, cancelled on close
+        self._background_tasks = []
+
+        # in-process caches, kept coherent through redis pub/sub
+        self.blocked_cache = LRUCache('blocked', max_size=10000, ttl=BLOCKED_TTL)
+        self.prefix_cache = LRUCache('prefixes', max_size=10000, ttl=PREFIXES_TTL)
+        self.guild_config_cache = LRUCache('guild_config', max_size=10000, ttl=GUILD_CONFIG_TTL)
+        self.invalidator = Invalidator(self.redis, loop=self.loop)
+        self.invalidator.register('blocked', lambda key: self.blocked_cache.invalidate(int(key)))
+        self.invalidator.register('prefixes', self._invalidate_prefixes)
+        self.invalidator.register('guild_config', lambda key: self.guild_config_cache.invalidate(int(key)))
+        self.start_background_task(self.invalidator.listen())
+
+        # operations that are fanned out to every process, like reloads (see kmn.control)
+        self.control = ControlPlane(
+            self.redis, loop=self.loop, name=self.process_name, **self.config.get('control', {})
+        )
+        self.control.register('stats', self._process_stats)
+        self.start_background_task(self.control.listen())
+
+        # compiled prefix matchers, keyed by guild id (None for dms)
+        self._matchers = {}
+
+        # in-flight and recent preflights, keyed by message id so that every consumer of a message shares one
+        self._preflights = LRUCache('preflights', max_size=1000, ttl=30)
+
+        # written on shutdown and restored on boot (see restore_snapshot), so that restarts aren't cold
+        snapshot_options = dict(self.config.get('snapshot', {}))
+        if snapshot_path is not None:
+            snapshot_options['path'] = snapshot_path
+        self.snapshot = Snapshot(**snapshot_options)
+        self.snapshotted = {
+            self.blocked_cache.name: (self.blocked_cache, self._revalidate_blocked),
+            self.prefix_cache.name: (self.prefix_cache, self._revalidate_prefixes),
+            self.guild_config_cache.name: (self.guild_config_cache, self._revalidate_guild_config)
+        }
+
+        # what read-only commands send, replayed for a short while
+        self.responses = ResponseCache(**self.config.get('response_cache', {}))
+
+        # members that aren't cached by discord.py, fetched when needed
+        self.member_fetcher = MemberFetcher(
+            self, max_size=member_policy.fetched_size, ttl=member_policy.fetched_ttl
+        )
+
+        # members, roles and users by name, for the converters in kmn.converters
+        self.lookup = Lookup(self)
+        self.lookup.install(self._connection)
+        for listener in self.lookup.listeners():
+            self.add_listener(listener)
+
+        self.caches = [
+            self.blocked_cache, self.prefix_cache, self.guild_config_cache, self._preflights, self.responses.cache,
+            self.member_fetcher.cache
+        ]
+
+        # per-command statistics, merged into redis periodically
+        self.command_stats = CommandStatsRegistry(self.redis, interval=self.config.get('command_stats_interval', 60))
+        self.start_background_task(self.command_stats.run())
+
+        # commands run on a bounded pool of workers, fairly across guilds
+        self.scheduler = CommandScheduler(self._invoke_now, metrics=self.metrics, **self.config.get('scheduler', {}))
+        self.start_background_task(self.scheduler.run())
+
+        # event loop lag, and whatever is causing it
+        self.lag_sampler = LagSampler(loop=self.loop, metrics=self.metrics)
+        self.start_background_task(self.lag_sampler.run())
+
+        self.stall_detector = StallDetector(loop=self.loop, threshold=self.config.get('stall_threshold_ms', 100) / 1000)
+        self.stall_detector.start()
+
+        # non-essential work is shed while the bot is falling behind
+        self.shedder = LoadShedder(lag_sampler=self.lag_sampler, scheduler=self.scheduler,
+                                   **self.config.get('shedding', {}))
+        self.start_background_task(self.shedder.run())
+
+        # every message goes through this, cogs register their own stages
+        self.pipeline = MessagePipeline(self, slow_threshold=self.config.get('slow_stage_ms', 100) / 1000)
+        self.pipeline.register('commands', self.process_message_commands)
+
+        # extension name -> stub commands, for cogs that haven't been loaded yet
+        self.lazy_stubs = {}
+        self._lazy_lock = asyncio.Lock()
 
         # load all cogs
         log.info('initial cog load')
-        self.load_all_cogs()
+        with self.startup.stage('cogs'):
+            self.load_all_cogs()
+
+        # reloads only what changed, optionally as soon as it's saved while testing
+        self.reloader = Reloader(self)
+        self.reloader.remember()
+        if self.testing and self.config.get('watch', False):
+            self.start_background_task(self.reloader.watch())
 
     @property
     def default_prefixes(self):
-        return self.config.get('prefixes', ['k?'])
+        return self.config.get('prefixes', DEFAULT_PREFIXES)
+
+    @property
+    def mention_prefixes(self):
+        return [f'<@{self.user.id}> ', f'<@!{self.user.id}> ']
 
     async def get_prefixes_for(self, guild: Guild):
+        prefixes = self.prefix_cache.get(guild.id)
+        if prefixes is not None:
+            return prefixes
+
         key = PREFIXES_KEY.format(guild)
 
-        with await self.redis as conn:
-            if not await conn.exists(key):
-                await conn.sadd(key, *self.default_prefixes)
-            return await conn.smembers(key, encoding='utf-8')
+        try:
+            with await self.redis as conn:
+                prefixes = await conn.smembers(key, encoding='utf-8')
+
+                # sets can't be empty in redis, so this guild has never had any prefixes. seed the defaults once.
+                if not prefixes:
+                    await conn.sadd(key, *self.default_prefixes)
+                    prefixes = list(self.default_prefixes)
+        except BackendUnavailable:
+            # degraded, go with the last prefixes we knew about
+            return self.prefix_cache.get_stale(guild.id, self.default_prefixes)
+
+        self.prefix_cache.put(guild.id, prefixes)
+        return prefixes
+
+    def _invalidate_prefixes(self, key):
+        self.prefix_cache.invalidate(int(key))
+        self._matchers.pop(int(key), None)
+        self.responses.invalidate('prefixes', guild=int(key))
+
+    async def flush_prefixes(self, guild: Guild):
+        """Drops the prefixes cached for a guild in every process."""
+        await self.invalidator.publish('prefixes', guild.id)
+
+    async def flush_guild_config(self, guild: Guild):
+        """Drops the configuration cached for a guild in every process."""
+        await self.invalidator.publish('guild_config', guild.id)
+
+    def preflight(self, msg: Message):
+        """Gathers the per-message facts that the bot and cogs need. Concurrent callers share the same result.
+
+        Returns something to await. When everything is cached that's an already finished future, so only messages
+        that need a round trip pay for a task.
+        """
+        preflight = self._cached_preflight(msg)
+        if preflight is not None:
+            future = self.loop.create_future()
+            future.set_result(preflight)
+            return future
+
+        task = self._preflights.get(msg.id)
+
+        if task is None:
+            task = self.loop.create_task(self._preflight(msg))
+            self._preflights.put(msg.id, task)
+
+        return task
+
+    def _cached_preflight(self, msg: Message):
+        author, guild = msg.author, msg.guild
+        blocked = self.blocked_cache.get(author.id)
+
+        if guild is None:
+            return Preflight(blocked=blocked, prefixes=self.default_prefixes, config={})
+
+        prefixes = self.prefix_cache.get(guild.id)
+        config = self.guild_config_cache.get(guild.id)
+
+        # the blocked status is only needed for commands, so it doesn't warrant a round trip by itself
+        if prefixes is not None and config is not None:
+            return Preflight(blocked=blocked, prefixes=prefixes, config=config)
+
+        return None
+
+    async def _preflight(self, msg: Message) -> Preflight:
+        author, guild = msg.author, msg.guild
+
+        try:
+            with await self.redis as conn:
+                preflight = await Preflight.run(
+                    conn, guild=guild, blocked_key=BLOCKED_KEY.format(author),
+                    prefixes_key=PREFIXES_KEY.format(guild), default_prefixes=self.default_prefixes
+                )
+        except BackendUnavailable:
+            # degraded, go with whatever we knew last
+            return Preflight(
+                blocked=self.blocked_cache.get_stale(author.id),
+                prefixes=self.prefix_cache.get_stale(guild.id, self.default_prefixes),
+                config=self.guild_config_cache.get_stale(guild.id, {})
+            )
+
+        # keep whatever we found
+        if preflight.blocked is not None:
+            self.blocked_cache.put(author.id, preflight.blocked)
+        self.prefix_cache.put(guild.id, preflight.prefixes)
+        self.guild_config_cache.put(guild.id, preflight.config)
+
+        return preflight
+
+    def could_be_command(self, msg: Message, prefixes) -> bool:
+        """Cheaply checks if a message starts with any prefix, without building a context."""
+        if self.user is None:
+            return False
+
+        key = msg.guild.id if msg.guild else None
+
+        # matchers are only rebuilt when the prefixes change. the identity check is the fast path, but the same
+        # prefixes can come back as a new list (like after a round trip)
+        matcher = self._matchers.get(key)
+        if matcher is None or (matcher.source is not prefixes and matcher.source != prefixes):
+            matcher = PrefixMatcher(self.mention_prefixes + list(prefixes), source=prefixes)
+            self._matchers[key] = matcher
+
+        return matcher.matches(msg.content)
 
     def load_all_cogs(self):
         exclude = {'__init__', '__pycache__'} | set(self.config.get('exclude_cogs', []))
         cog_path = Path(__file__).parent / 'cogs'
         cogs = {cog.stem for cog in cog_path.iterdir() if cog.stem not in exclude}
+        lazy = set(LAZY_COGS) if self.config.get('lazy_cogs', False) else set()
+
         for cog in cogs:
+            if cog in lazy:
+                log.info('initial load: kmn.cogs.%s (lazy)', cog)
+                self._register_lazy_cog(cog)
+                continue
+
             log.info('initial load: kmn.cogs.%s', cog)
-            self.load_extension(f'kmn.cogs.{cog}')
+            with self.startup.stage(f'cog {cog}'):
+                self.load_extension(f'kmn.cogs.{cog}')
+
+    def _register_lazy_cog(self, cog):
+        stubs = [make_stub(cog, name, aliases, brief) for name, aliases, brief in LAZY_COGS[cog]]
+        for stub in stubs:
+            self.add_command(stub)
+        self.lazy_stubs[cog] = stubs
+
+    async def load_lazy_cog(self, cog):
+        """Loads a cog that was registered lazily, replacing its stubs."""
+        async with self._lazy_lock:
+            stubs = self.lazy_stubs.get(cog)
+            if stubs is None:
+                # somebody beat us to it
+                return
+
+            started = time.perf_counter()
+            name = f'kmn.cogs.{cog}'
+
+            # importing is the slow part, so keep it off of the loop
+            await self.loop.run_in_executor(None, importlib.import_module, name)
+
+            for stub in stubs:
+                self.remove_command(stub.name)
+
+            try:
+                self.load_extension(name)
+            except Exception:
+                for stub in stubs:
+                    self.add_command(stub)
+                raise
+
+            del self.lazy_stubs[cog]
+            log.info('lazily loaded %s in %.2fms', name, (time.perf_counter() - started) * 1000)
+
+    @property
+    def process_name(self):
+        return f'{socket.gethostname()}:{os.getpid()}'
+
+    async def _process_stats(self):
+        latency = self.latency
+        return {
+            'guilds': len(self.guilds),
+            'members': sum(guild.member_count or 0 for guild in self.guilds),
+            'latency': None if math.isnan(latency) or math.isinf(latency) else latency,
+            'lag': self.lag_sampler.lag
+        }
 
     @property
     def testing(self):
         return self.config.get('environment', 'production') == 'testing'
 
-    async def save_config(self):
+    def _save_config(self):
         with open('config.json', 'w') as fp:
             json.dump(self.config, fp, indent=2)
+
+    async def save_config(self):
+        await self.loop.run_in_executor(None, self._save_config)
         log.info('saved configuration')
 
+    def start_background_task(self, coro):
+        """Runs a coroutine for as long as the bot is alive."""
+        task = self.loop.create_task(coro)
+        self._background_tasks.append(task)
+        return task
+
+    def restore_snapshot(self):
+        """Fills the in-process caches from the last snapshot, and revalidates them in the background."""
+        restored = self.snapshot.load()
+
+        for name, entries in restored.items():
+            if name not in self.snapshotted:
+                continue
+            cache, _ = self.snapshotted[name]
+            for key, value, ttl in entries:
+                cache.put(key, value, ttl=ttl)
+
+        log.info('restored %d cache entries from snapshot', sum(len(entries) for entries in restored.values()))
+
+        if restored:
+            self.start_background_task(self._revalidate_snapshot(restored))
+
+    async def save_snapshot(self):
+        entries = {name: cache.items() for name, (cache, _) in self.snapshotted.items()}
+        await self.loop.run_in_executor(None, self.snapshot.save, entries)
+
+    async def _revalidate_snapshot(self, restored, *, chunk_size=100):
+        # entries might have been invalidated while we were down, so refresh them -- slowly, this isn't urgent
+        for name, entries in restored.items():
+            if name not in self.snapshotted:
+                continue
+
+            cache, revalidate = self.snapshotted[name]
+            keys = [key for key, _, _ in entries]
+
+            for start in range(0, len(keys), chunk_size):
+                while self.shedder.shedding:
+                    await asyncio.sleep(5)
+
+                chunk = keys[start:start + chunk_size]
+                results = await asyncio.gather(*(revalidate(key) for key in chunk), return_exceptions=True)
+                failed = {key: result for key, result in zip(chunk, results) if isinstance(result, Exception)}
+
+                if any(isinstance(error, BackendUnavailable) for error in failed.values()):
+                    log.warning('giving up on revalidating the snapshot, backends are unavailable')
+                    return
+
+                # anything else is just these entries' problem. don't trust them, but keep going
+                if failed:
+                    key, error = next(iter(failed.items()))
+                    log.warning('failed to revalidate %d %s entries (%r: %r)', len(failed), name, key, error)
+                    for key in failed:
+                        cache.invalidate(key)
+
+                await asyncio.sleep(1)
+
+        log.info('revalidated snapshot')
+
+    async def _revalidate_blocked(self, user_id):
+        value = await self.redis.get(BLOCKED_KEY.format(Object(user_id)))
+
+        # not cached in redis anymore, look it up properly the next time it's needed
+        if value is None:
+            self.blocked_cache.invalidate(user_id)
+        else:
+            self.blocked_cache.put(user_id, value.decode() == 'yes')
+
+    async def _revalidate_prefixes(self, guild_id):
+        prefixes = await self.redis.smembers(PREFIXES_KEY.format(Object(guild_id)), encoding='utf-8')
+
+        if not prefixes:
+            self.prefix_cache.invalidate(guild_id)
+        else:
+            self.prefix_cache.put(guild_id, prefixes)
+
+    async def _revalidate_guild_config(self, guild_id):
+        keys = [GUILD_KEY.format(Object(guild_id), key) for key in PREFLIGHT_CONFIG_KEYS]
+        values = await self.redis.mget(*keys, encoding='utf-8')
+        self.guild_config_cache.put(guild_id, dict(zip(PREFLIGHT_CONFIG_KEYS, values)))
+
+    async def close(self):
+        for task in self._background_tasks:
+            task.cancel()
+        self.stall_detector.stop()
+
+        try:
+            await self.save_snapshot()
+        except Exception:
+            log.exception('failed to save snapshot on close')
+
+        try:
+            await self.command_stats.flush()
+        except Exception:
+            log.exception('failed to flush command stats on close')
+
+        await super().close()
+
+    async def invoke(self, ctx):
+        # swap stubs out for the real thing
+        cog = getattr(ctx.command, 'lazy_extension', None)
+        if cog is not None:
+            await self.load_lazy_cog(cog)
+            ctx.command = self.all_commands.get(ctx.invoked_with)
+
+        if ctx.command is None:
+            return await super().invoke(ctx)
+
+        # authors that aren't cached (see kmn.members) come in as users, but checks need their roles
+        if ctx.guild is not None and not isinstance(ctx.author, Member):
+            member = await self.member_fetcher.get(ctx.guild, ctx.author.id)
+            if member is not None:
+                ctx.message.author = member
+                # the context caches its author
+                vars(ctx).pop('author', None)
+
+        await self.scheduler.submit(ctx, priority=has_priority(ctx.command))
+
+    async def _invoke_now(self, ctx):
+        name = ctx.command.qualified_name
+        stats = self.command_stats.get(name)
+        stats.enter()
+        started = time.perf_counter()
+
+        try:
+            with self.tracer.trace(f'command {name}', author=ctx.author.id, guild=ctx.guild.id if ctx.guild else None):
+                await super().invoke(ctx)
+        finally:
+            stats.exit(time.perf_counter() - started)
+
     async def on_ready(self):
         log.info('logged in as %s (%d)', self.user, self.user.id)
 
-    async def is_blocked(self, user):
-        # grab cached value
-        with await self.redis as conn:
-            value = await conn.get(BLOCKED_KEY.format(user))
+        if self.startup.ready_at is None:
+            self.startup.end('gateway')
+            self.startup.ready()
+            log.info('startup: %s', self.startup.summary())
+
+    async def is_blocked(self, user, *, preflight: Preflight = None):
+        # grab value cached in this process
+        blocked = self.blocked_cache.get(user.id)
+        if blocked is not None:
+            return blocked
 
-        # value was cached
-        if value is not None:
-            return value.decode() == 'yes'
+        # grab value cached in redis, unless the preflight already tried
+        if preflight is None or not preflight.fetched:
+            try:
+                with await self.redis as conn:
+                    value = await conn.get(BLOCKED_KEY.format(user))
+            except BackendUnavailable:
+                value = None
+
+            # value was cached
+            if value is not None:
+                blocked = value.decode() == 'yes'
+                self.blocked_cache.put(user.id, blocked)
+                return blocked
 
         # grab their blocked status from the database
         query = """
             SELECT * FROM blocked_users
             WHERE user_id = $1
         """
-        record = await self.postgres.fetchrow(query, user.id)
+
+        try:
+            record = await self.postgres.fetchrow(query, user.id)
+        except BackendUnavailable:
+            # degraded, go with the last status we knew about. if we never knew, let them through.
+            return self.blocked_cache.get_stale(user.id, False)
 
         # cache the blocked value in redis
-        with await self.redis as conn:
-            await conn.set(
-                BLOCKED_KEY.format(user),
-                'no' if record is None else 'yes',
-                expire=600  # 10 minutes
-            )
+        try:
+            with await self.redis as conn:
+                await conn.set(
+                    BLOCKED_KEY.format(user),
+                    'no' if record is None else 'yes',
+                    expire=BLOCKED_TTL
+                )
+        except BackendUnavailable:
+            pass
 
+        self.blocked_cache.put(user.id, record is not None)
         return record is not None
 
-    async def on_message(self, message):
+    async def process_message_commands(self, state: MessageState):
+        message = state.message
+
         # ignore bots
         if message.author.bot:
             return
 
+        # most messages aren't commands, throw those away before doing anything expensive
+        with self.metrics.timed('message.prefix'):
+            preflight = await state.preflight()
+            could_be_command = self.could_be_command(message, preflight.prefixes)
+
+        if not could_be_command:
+            return
+
         # ignore blocked users
-        if await self.is_blocked(message.author):
+        with self.metrics.timed('message.blocked'):
+            blocked = await state.is_blocked()
+
+        if blocked:
             return
 
         # invoke context
-        ctx = await self.get_context(message, cls=Context)
-        await self.invoke(ctx)
+        with self.metrics.timed('message.context'):
+            ctx = await self.get_context(message, cls=Context)
+
+        # the command runs outside of the stage, which only covers what it costs to look at a message
+        self.loop.create_task(self._dispatch_command(ctx))
+
+    async def _dispatch_command(self, ctx):
+        try:
+            with self.metrics.timed('message.invoke'):
+                await self.invoke(ctx)
+        except Exception:
+            log.exception('failed to invoke %s', ctx.invoked_with)
+
+    async def on_message(self, message):
+        await self.pipeline.process(message)
 
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class BackendUnavailable(Exception):
+    """Raised when a backend call fails because the backend is down, slow, or its breaker is open."""
+
+    def __init__(self, backend: str, reason: str):
+        super().__init__(f'{backend} is unavailable: {reason}')
+        self.backend = backend
+        self.reason = reason
+
+
+class CircuitBreaker:
+    """Fails calls to a backend fast once it looks like it is down.
+
+    Calls made through :meth:`call` get a timeout. After ``threshold`` consecutive failures (those timeouts, connection
+    errors) the breaker opens and calls are refused straight away. After ``reset_after`` seconds a single probe call is
+    let through (half-open): if it succeeds the breaker closes, otherwise it opens again.
+
+    ``is_failure`` decides whether an exception means the backend is unhealthy -- an error reply is still an answer,
+    so it shouldn't trip the breaker.
+    """
+
+    def __init__(self, name: str, *, timeout: float = 2.0, threshold: int = 5, reset_after: float = 10.0,
+                 is_failure=None):
+        self.name = name
+        self.timeout = timeout
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.is_failure = is_failure or (lambda error: True)
+
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+        # statistics
+        self.trips = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self.state != CLOSED
+
+    def _allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_after:
+            self.state = HALF_OPEN
+            log.info('%s breaker is half-open, probing', self.name)
+
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+
+        return False
+
+    def _succeeded(self):
+        if self.state != CLOSED:
+            log.warning('%s breaker closed, backend recovered', self.name)
+        self.state = CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def _failed(self):
+        self.failures += 1
+        self._probing = False
+
+        if self.state == HALF_OPEN or self.failures >= self.threshold:
+            if self.state == CLOSED:
+                self.trips += 1
+                log.warning('%s breaker opened after %d failures', self.name, self.failures)
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    async def call(self, func, *args, **kwargs):
+        """Calls a coroutine function (or anything returning an awaitable) through the breaker, with its timeout."""
+        return await self._guard(func, args, kwargs, timeout=self.timeout)
+
+    async def track(self, func, *args, **kwargs):
+        """Like :meth:`call`, but without the timeout.
+
+        This is for work that takes as long as the caller asks for (like running a statement), where being slow doesn't
+        say anything about the backend. Only errors that ``is_failure`` accepts count against it.
+        """
+        return await self._guard(func, args, kwargs, timeout=None)
+
+    async def _guard(self, func, args, kwargs, *, timeout):
+        if not self._allow():
+            self.rejected += 1
+            raise BackendUnavailable(self.name, 'circuit breaker is open')
+
+        try:
+            if timeout is None:
+                result = await func(*args, **kwargs)
+            else:
+                result = await asyncio.wait_for(func(*args, **kwargs), timeout)
+        except asyncio.TimeoutError as error:
+            if timeout is None:
+                # the callee's own timeout
+                self._succeeded()
+                raise
+            self.timeouts += 1
+            self._failed()
+            raise BackendUnavailable(self.name, f'timed out after {timeout}s') from error
+        except asyncio.CancelledError:
+            # the caller gave up, which says nothing about the backend
+            self._probing = False
+            raise
+        except Exception as error:
+            if not self.is_failure(error):
+                self._succeeded()
+                raise
+            self._failed()
+            raise BackendUnavailable(self.name, f'{type(error).__name__}: {error}') from error
+
+        self._succeeded()
+        return result
@@ -0,0 +1,96 @@
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LRUCache:
+    """A bounded, in-process LRU cache with optional per-entry expiry."""
+
+    def __init__(self, name: str, *, max_size: int = 1024, ttl: float = None):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+
+        # statistics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # key -> (expires_at, value)
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        entry = self._data.get(key)
+        return entry is not None and not self._expired(entry)
+
+    def _expired(self, entry):
+        expires_at, _ = entry
+        return expires_at is not None and expires_at < time.monotonic()
+
+    def get(self, key, default=None):
+        """Returns a cached value, or ``default`` if it is missing or has expired."""
+        entry = self._data.get(key)
+
+        # expired entries are kept around for get_stale, until they are evicted or replaced
+        if entry is None or self._expired(entry):
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def get_stale(self, key, default=None):
+        """Returns a cached value even if it has expired, for when the source of truth can't be reached."""
+        entry = self._data.get(key)
+        return default if entry is None else entry[1]
+
+    def put(self, key, value, *, ttl=_MISSING):
+        """Caches a value, evicting the least recently used entry if the cache is full."""
+        ttl = self.ttl if ttl is _MISSING else ttl
+        expires_at = None if ttl is None else time.monotonic() + ttl
+
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def items(self):
+        """Returns ``(key, value, ttl)`` for every entry that hasn't expired, where ``ttl`` is the time it has left."""
+        now = time.monotonic()
+        return [
+            (key, value, None if expires_at is None else expires_at - now)
+            for key, (expires_at, value) in self._data.items()
+            if expires_at is None or expires_at >= now
+        ]
+
+    def invalidate(self, key):
+        """Drops a single entry."""
+        self._data.pop(key, None)
+
+    def invalidate_where(self, predicate):
+        """Drops every entry for which ``predicate(key, value)`` is true."""
+        for key in [key for key, (_, value) in self._data.items() if predicate(key, value)]:
+            del self._data[key]
+
+    def clear(self):
+        """Drops every entry."""
+        self._data.clear()
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def reset_stats(self):
+        self.hits = self.misses = self.evictions = 0
+
+    def __repr__(self):
+        return (f'<LRUCache name={self.name!r} size={len(self)}/{self.max_size} '
+                f'hits={self.hits} misses={self.misses}>')
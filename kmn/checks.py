@@ -4,4 +4,20 @@ from discord.ext import commands
 def is_bot_admin():
     def _check(ctx):
         return ctx.author.id in ctx.bot.config.get('admins', [])
+
+    # commands guarded by this go into the scheduler's priority lane, see has_priority
+    _check.priority = True
     return commands.check(_check)
+
+
+def has_priority(command) -> bool:
+    """Returns whether a command (or one of its parents) is an admin command, which get their own scheduler lane.
+
+    Those are commands with an :func:`is_bot_admin` check, or a truthy ``priority`` attribute.
+    """
+    while command is not None:
+        if getattr(command, 'priority', False) or any(getattr(check, 'priority', False) for check in command.checks):
+            return True
+        command = command.parent
+
+    return False
@@ -0,0 +1,308 @@
+"""
+Cluster mode: a supervisor forks a number of worker processes, each running a contiguous range of the shards.
+
+Every worker has its own event loop, Postgres and Redis pools, caches and snapshot. The supervisor starts the
+workers one identify window after another (Discord only lets a bot identify one shard every 5 seconds), restarts
+workers that crash, and logs the resource usage that the workers periodically report back to it.
+"""
+
+import asyncio
+import json
+import logging
+import math
+import multiprocessing
+import os
+import queue
+import resource
+import signal
+import socket
+import time
+from pathlib import Path
+
+from discord.ext.commands import AutoShardedBot
+
+from kmn.bot import Bot
+from kmn.launch import launch
+from kmn.log import setup_logging
+from kmn.startup import StartupTimings
+
+log = logging.getLogger(__name__)
+
+
+def _current_rss():
+    try:
+        with open('/proc/self/statm') as fp:
+            return int(fp.read().split()[1]) * resource.getpagesize()
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def resource_usage() -> dict:
+    """Memory (in bytes) and CPU time (in seconds) used by this process."""
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+
+    # ru_maxrss is in kilobytes on linux
+    peak_rss = usage.ru_maxrss * 1024
+    rss = _current_rss()
+
+    return {
+        'rss': peak_rss if rss is None else rss,
+        'peak_rss': peak_rss,
+        'cpu': usage.ru_utime + usage.ru_stime
+    }
+
+
+class ShardedBot(Bot, AutoShardedBot):
+    """The bot as run by a cluster worker, with only some of the shards."""
+
+    def __init__(self, *, worker: int, reports, report_interval: float = 15.0, **kwargs):
+        # needed for process_name, which the bot uses while it's being set up
+        self.worker = worker
+        super().__init__(**kwargs)
+
+        self.reports = reports
+        self.start_background_task(self.report_usage(report_interval))
+
+    @property
+    def process_name(self):
+        return f'worker {self.worker} on {socket.gethostname()}'
+
+    async def _process_stats(self):
+        return {**await super()._process_stats(), 'shards': self.shard_ids}
+
+    def usage(self) -> dict:
+        latency = self.latency
+
+        return {
+            'worker': self.worker,
+            'pid': os.getpid(),
+            'time': time.time(),
+            'ready': self.is_ready(),
+            'guilds': len(self.guilds),
+            'latency': None if math.isnan(latency) or math.isinf(latency) else latency,
+            'lag': self.lag_sampler.lag,
+            **resource_usage()
+        }
+
+    async def report_usage(self, interval: float):
+        while not self.is_closed():
+            # unbounded, so this never blocks the loop (a feeder thread does the writing)
+            self.reports.put_nowait(self.usage())
+            await asyncio.sleep(interval)
+
+
+def worker_options(config: dict, index: int) -> dict:
+    """Options that differ between workers. Kept out of the config, which gets saved back to disk as is."""
+    options = {}
+
+    # every worker has different guilds, so it needs its own snapshot...
+    path = Path(config.get('snapshot', {}).get('path', '_snapshot.json'))
+    options['snapshot_path'] = str(path.with_name(f'{path.stem}.{index}{path.suffix}'))
+
+    # ...and its own port to expose metrics on
+    if 'metrics' in config:
+        options['metrics_port'] = config['metrics'].get('port', 9090) + index
+
+    return options
+
+
+def _worker_main(config, index, shard_ids, shard_count, reports, report_interval):
+    started_at = time.perf_counter()
+
+    # ctrl+c reaches the whole process group, but the supervisor decides when (and how) we stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    # the supervisor's handlers (and the queue listener thread) didn't survive the fork
+    logging.getLogger().handlers.clear()
+    log_listener = setup_logging(config.get('logging', {}))
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    try:
+        loop.run_until_complete(launch(
+            config, StartupTimings(started_at), bot_class=ShardedBot, shard_ids=shard_ids, shard_count=shard_count,
+            worker=index, reports=reports, report_interval=report_interval, **worker_options(config, index)
+        ))
+    finally:
+        if log_listener is not None:
+            log_listener.stop()
+
+
+class Worker:
+    def __init__(self, index: int, shard_ids: list):
+        self.index = index
+        self.shard_ids = shard_ids
+        self.process = None
+        self.started_at = None
+
+        # crashes in a row, for backing off
+        self.crashes = 0
+        self.restarts = 0
+
+        # exited on purpose (e.g. through `die`), so it isn't restarted
+        self.finished = False
+
+        self.report = None
+        self.cpu_percent = None
+
+    @property
+    def shards(self) -> str:
+        return f'{self.shard_ids[0]}-{self.shard_ids[-1]}'
+
+    def receive(self, report: dict):
+        previous = self.report
+        if previous is not None and previous['pid'] == report['pid'] and report['time'] > previous['time']:
+            self.cpu_percent = (report['cpu'] - previous['cpu']) / (report['time'] - previous['time']) * 100
+        self.report = report
+
+    def format(self) -> str:
+        head = f'worker {self.index} (shards {self.shards}, {self.restarts} restarts)'
+        report = self.report
+
+        if report is None:
+            return f'{head}: no report yet'
+
+        cpu = '?' if self.cpu_percent is None else f'{self.cpu_percent:.1f}%'
+        return (
+            f'{head}: pid {report["pid"]}, {"ready" if report["ready"] else "starting"}, {report["guilds"]} guilds, '
+            f'rss {report["rss"] / 2 ** 20:.1f} MiB (peak {report["peak_rss"] / 2 ** 20:.1f} MiB), cpu {cpu}, '
+            f'lag {report["lag"] * 1000:.0f}ms'
+        )
+
+
+class Supervisor:
+    """Runs ``processes`` workers with ``shards_per_process`` shards each, and restarts them when they crash."""
+
+    def __init__(self, config: dict, *, processes: int, shards_per_process: int, config_path: str = 'config.json',
+                 identify_delay: float = 5.5, report_interval: float = 15.0, max_restart_delay: float = 60.0, stop_timeout: float = 30.0):
+        self.config = config
+        self.config_path = config_path
+        self.identify_delay = identify_delay
+        self.report_interval = report_interval
+        self.max_restart_delay = max_restart_delay
+        self.stop_timeout = stop_timeout
+
+        self.shard_count = processes * shards_per_process
+        self.workers = [
+            Worker(index, list(range(index * shards_per_process, (index + 1) * shards_per_process)))
+            for index in range(processes)
+        ]
+
+        # forked, not spawned: the launcher isn't importable, and the parent has no event loop or pools to inherit
+        self.context = multiprocessing.get_context('fork')
+        self.reports = self.context.Queue()
+
+        # worker index -> when to start it
+        self.pending = {}
+
+        # when the next worker can start identifying without running into the previous one
+        self._identify_free_at = 0.0
+        self._stopping = False
+
+    def _schedule(self, worker: Worker, delay: float = 0.0):
+        at = max(time.monotonic() + delay, self._identify_free_at)
+
+        # a worker identifies its shards one after another, so it holds on to the window for a while
+        self._identify_free_at = at + len(worker.shard_ids) * self.identify_delay
+        self.pending[worker.index] = at
+
+    def _current_config(self) -> dict:
+        # workers save changes made at runtime (like promoted admins), replacements should start with those
+        try:
+            with open(self.config_path, 'r') as fp:
+                self.config = json.load(fp)
+        except (OSError, ValueError):
+            log.exception("couldn't read %s, using the config from before", self.config_path)
+        return self.config
+
+    def _start(self, worker: Worker):
+        worker.process = self.context.Process(
+            target=_worker_main, name=f'kmn-worker-{worker.index}',
+            args=(self._current_config(), worker.index, worker.shard_ids, self.shard_count, self.reports, self.report_interval)
+        )
+        worker.process.start()
+        worker.started_at = time.monotonic()
+        log.info('started worker %d (pid %d, shards %s)', worker.index, worker.process.pid, worker.shards)
+
+    def _check(self):
+        now = time.monotonic()
+
+        for index, at in list(self.pending.items()):
+            if at <= now:
+                del self.pending[index]
+                self._start(self.workers[index])
+
+        for worker in self.workers:
+            if worker.process is None or worker.finished or worker.index in self.pending or worker.process.is_alive():
+                continue
+
+            if worker.process.exitcode == 0:
+                log.info('worker %d (shards %s) exited', worker.index, worker.shards)
+                worker.finished = True
+                continue
+
+            # only back off when it keeps dying soon after starting
+            if now - worker.started_at < self.max_restart_delay:
+                worker.crashes += 1
+            else:
+                worker.crashes = 1
+
+            delay = min(self.max_restart_delay, 2 ** (worker.crashes - 1))
+            worker.restarts += 1
+
+            log.warning('worker %d (shards %s) exited with code %s, restarting in at least %.0fs', worker.index,
+                        worker.shards, worker.process.exitcode, delay)
+            self._schedule(worker, delay)
+
+    def _drain(self):
+        while True:
+            try:
+                report = self.reports.get_nowait()
+            except queue.Empty:
+                return
+            self.workers[report['worker']].receive(report)
+
+    def _request_stop(self, *_):
+        self._stopping = True
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+
+        log.info('starting %d workers for %d shards', len(self.workers), self.shard_count)
+        for worker in self.workers:
+            self._schedule(worker)
+
+        last_summary = time.monotonic()
+
+        try:
+            while not self._stopping and not all(worker.finished for worker in self.workers):
+                self._check()
+                self._drain()
+
+                if time.monotonic() - last_summary >= self.report_interval:
+                    last_summary = time.monotonic()
+                    for worker in self.workers:
+                        log.info('%s', worker.format())
+
+                time.sleep(0.5)
+        finally:
+            self.stop()
+
+    def stop(self):
+        log.info('stopping workers')
+        running = [worker.process for worker in self.workers
+                   if worker.process is not None and worker.process.is_alive()]
+
+        # SIGTERM makes the workers close the bot (and save their snapshot)
+        for process in running:
+            process.terminate()
+
+        deadline = time.monotonic() + self.stop_timeout
+        for process in running:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                log.warning('worker %s did not stop in time, killing it', process.name)
+                process.kill()
+                process.join()
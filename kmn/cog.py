@@ -1,16 +1,71 @@
+import inspect
+
 from aiohttp import ClientSession
 
+from kmn.tracing import http_trace_config
+
 
 class Cog:
+    # whether background tasks started through create_task survive reloads (see hand_over)
+    keep_tasks_on_reload = False
+
     def __init__(self, bot):
         self.bot = bot
-        self.session = ClientSession(loop=bot.loop)
+
+        # background tasks, cancelled on unload unless they are handed over to a replacement
+        self._tasks = set()
+
+        # outgoing requests get spans while tracing
+        session_options = {}
+        trace_config = http_trace_config(bot.tracer) if bot.tracer.enabled else None
+        if trace_config is not None:
+            session_options['trace_configs'] = [trace_config]
+
+        self.session = ClientSession(loop=bot.loop, **session_options)
+
+        # register message pipeline stages
+        self._stages = []
+        for name, func in inspect.getmembers(type(self), inspect.iscoroutinefunction):
+            stage_name = getattr(func, '__message_stage__', None)
+            if stage_name is not None:
+                stage_name = f'{type(self).__name__}.{stage_name}'
+                bot.pipeline.register(stage_name, getattr(self, name))
+                self._stages.append(stage_name)
 
         # not particularly proud of this
         mangle_key = f'_{type(self).__name__}__unload'
         self._original_unload = getattr(self, mangle_key, None)
         setattr(self, mangle_key, self.__unload)
 
+    def create_task(self, coro):
+        """Runs a coroutine in the background, for as long as this cog (or the one replacing it) is loaded."""
+        task = self.bot.loop.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def export_state(self) -> dict:
+        """Returns state to hand over to the instance that replaces this one when its extension is reloaded."""
+        return {}
+
+    def import_state(self, state: dict):
+        """Takes over state that was exported by the instance this one replaces."""
+
+    def hand_over(self):
+        """Exports state and, if the cog keeps them, its background tasks. Called right before a reload."""
+        tasks = set()
+        if self.keep_tasks_on_reload:
+            tasks, self._tasks = self._tasks, set()
+        return self.export_state(), tasks
+
+    def take_over(self, state: dict, tasks):
+        """Takes over what :meth:`hand_over` returned on the instance this one replaces."""
+        for task in tasks:
+            if not task.done():
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        self.import_state(state)
+
     @property
     def pg(self):
         """Shortcut to ``Bot.postgres``."""
@@ -22,6 +77,10 @@ class Cog:
         return self.bot.redis
 
     def __unload(self):
+        for task in list(self._tasks):
+            task.cancel()
+        for stage_name in self._stages:
+            self.bot.pipeline.unregister(stage_name)
         self.session.close()
         if self._original_unload:
             self._original_unload()
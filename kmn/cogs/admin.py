@@ -17,6 +17,9 @@ from kmn.bot import BLOCKED_KEY
 
 log = logging.getLogger(__name__)
 
+# seconds that statements run through `sql` may take
+SQL_TIMEOUT = 120
+
 
 async def shell(command):
     shell = await asyncio.create_subprocess_shell(
@@ -27,16 +30,62 @@ async def shell(command):
 
 
 class Admin(Cog):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.load_list = set(self.bot.extensions.copy().keys())
+    def __init__(self, bot):
+        super().__init__(bot)
+
+        # fanned out to every process (see kmn.control)
+        bot.control.register('reload', self.reload_locally)
+        bot.control.register('promote', self.promote_locally)
+        bot.control.register('die', self.die_locally)
+
+    def __unload(self):
+        for operation in ('reload', 'promote', 'die'):
+            self.bot.control.unregister(operation)
+
+    async def die_locally(self):
+        # give the reply a moment to make it out first
+        self.bot.loop.call_later(1, lambda: self.bot.loop.create_task(self.bot.logout()))
 
     @command()
     @is_bot_admin()
     async def die(self, ctx):
-        """kills me"""
+        """kills me (everywhere)"""
         await ctx.send('ok, bye.')
-        await ctx.bot.logout()
+        gathered = await ctx.bot.control.broadcast('die')
+        log.info('%s asked %d processes to die', ctx.author, len(gathered.replies))
+
+    @command(hidden=True)
+    @is_bot_admin()
+    async def cluster(self, ctx):
+        """shows guild and member counts for every process"""
+        gathered = await ctx.bot.control.broadcast('stats')
+        table = Table('process', 'shards', 'guilds', 'members', 'latency', 'lag')
+        guilds = members = 0
+
+        for reply in sorted(gathered, key=lambda reply: reply.process):
+            if not reply.ok:
+                table.add_row(reply.process, '', '', '', '', reply.error)
+                continue
+
+            stats = reply.result
+            guilds += stats['guilds']
+            members += stats['members']
+
+            shards = stats.get('shards')
+            latency = stats['latency']
+            table.add_row(
+                reply.process, f'{shards[0]}-{shards[-1]}' if shards else '-', str(stats['guilds']),
+                str(stats['members']), '?' if latency is None else f'{latency * 1000:.0f}ms',
+                f'{stats["lag"] * 1000:.0f}ms'
+            )
+
+        processes = len(gathered.results)
+        summary = f'{plural(guild=guilds)} and {plural(member=members)} across {processes} ' + \
+            ('process' if processes == 1 else 'processes')
+        if gathered.describe():
+            summary += f' ({gathered.describe()})'
+
+        await ctx.send(f'{summary}.\n{codeblock(table.rendered)}')
 
     @command(hidden=True, aliases=['sh'])
     @is_bot_admin()
@@ -52,15 +101,28 @@ class Admin(Cog):
         if not await ctx.confirm(title='danger', description=f'make {who} a global admin?'):
             return
 
-        self.bot.config['admins'].append(who.id)
+        gathered = await self.bot.control.broadcast('promote', user_id=who.id)
         await self.bot.save_config()
-        await ctx.send(f'\N{OK HAND SIGN} made {who} a global admin.')
+
+        message = f'\N{OK HAND SIGN} made {who} a global admin.'
+        if gathered.describe():
+            message += f' ({gathered.describe()})'
+        await ctx.send(message)
+
+    async def promote_locally(self, *, user_id: int):
+        if user_id not in self.bot.config['admins']:
+            self.bot.config['admins'].append(user_id)
+        self.bot.responses.invalidate('about')
+        self.bot.responses.invalidate('help')
 
     async def flush_blocked_status(self, user: User):
         with await self.redis as conn:
             log.info('flushing blocked status for %d', user.id)
             await conn.delete(BLOCKED_KEY.format(user))
 
+        # drop the status cached in every process
+        await self.bot.invalidator.publish('blocked', user.id)
+
     @group(hidden=True, invoke_without_command=True)
     @is_bot_admin()
     async def block(self, ctx, who: User, *, reason=None):
@@ -128,9 +190,11 @@ class Admin(Cog):
 
         try:
             with Timer() as t:
-                result = await coro(sql)
+                result = await coro(sql, timeout=SQL_TIMEOUT)
         except asyncpg.PostgresError as e:
             return await ctx.send(f'\N{CACTUS} Failed to execute! {type(e).__name__}: {e}')
+        except asyncio.TimeoutError:
+            return await ctx.send(f'\N{CACTUS} Gave up after {SQL_TIMEOUT}s.')
 
         # execute returns the status as a string
         if isinstance(result, str):
@@ -160,22 +224,66 @@ class Admin(Cog):
         else:
             await ctx.send(content)
 
+    async def reload_locally(self, *, everything: bool = False):
+        results, pinned = self.bot.reloader.reload(everything=everything)
+
+        # commands might have changed, along with anything they'd say
+        self.bot.responses.clear()
+
+        return {
+            'results': [
+                [result.module, result.duration, None if result.ok else type(result.error).__name__, result.rolled_back]
+                for result in results
+            ],
+            'pinned': pinned
+        }
+
     @command(aliases=['r'])
     @is_bot_admin()
-    async def reload(self, ctx):
-        """reloads all extensions"""
+    async def reload(self, ctx, everything: bool = False):
+        """reloads changed extensions (everywhere)"""
         progress = await ctx.send('reloading...')
 
         with Timer() as t:
-            for name in self.load_list:
-                try:
-                    ctx.bot.unload_extension(name)
-                    ctx.bot.load_extension(name)
-                except Exception:
-                    log.exception('Failed to load %s:', name)
-                    return await progress.edit(content=f'failed to load `{name}`.')
-
-        await progress.edit(content=f'reloaded in `{t}`.')
+            gathered = await ctx.bot.control.broadcast('reload', everything=everything)
+
+        table = Table('process', 'module', 'time', 'result')
+        reloaded = failed = 0
+        pinned = set()
+        rows = 0
+
+        for reply in sorted(gathered, key=lambda reply: reply.process):
+            if not reply.ok:
+                failed += 1
+                table.add_row(reply.process, '', f'{reply.duration * 1000:.2f}ms', reply.error)
+                rows += 1
+                continue
+
+            pinned.update(reply.result['pinned'])
+
+            for module, duration, error, rolled_back in reply.result['results']:
+                if error is None:
+                    reloaded += 1
+                    outcome = 'ok'
+                else:
+                    failed += 1
+                    outcome = error + (', rolled back' if rolled_back else '')
+                table.add_row(reply.process, module, f'{duration * 1000:.2f}ms', outcome)
+                rows += 1
+
+        if not rows and not pinned:
+            return await progress.edit(content='nothing changed.')
+
+        processes = len(gathered.replies)
+        summary = f"reloaded {plural(module=reloaded)} in {processes} process{'es' if processes != 1 else ''} in `{t}`"
+        if failed:
+            summary += f', {failed} failed'
+        if gathered.describe():
+            summary += f' ({gathered.describe()})'
+        if pinned:
+            summary += f". restart to pick up changes to {', '.join(f'`{name}`' for name in sorted(pinned))}"
+
+        await progress.edit(content=f'{summary}.\n{codeblock(table.rendered)}' if rows else f'{summary}.')
 
 
 def setup(bot):
@@ -7,6 +7,7 @@ from kmn.bot import PREFIXES_KEY
 from kmn.checks import is_bot_admin
 from kmn.cog import Cog
 from kmn.context import Context
+from kmn.responses import cached_response
 
 
 class Field(namedtuple('Field', 'type description')):
@@ -68,6 +69,7 @@ class Config(Cog):
         """add a prefix"""
         with await self.redis as conn:
             await conn.sadd(PREFIXES_KEY.format(ctx.guild), prefix)
+        await ctx.bot.flush_prefixes(ctx.guild)
         await ctx.ok()
 
     @prefix.command(name='remove')
@@ -78,9 +80,11 @@ class Config(Cog):
 
         with await self.redis as conn:
             await conn.srem(PREFIXES_KEY.format(ctx.guild), prefix)
+        await ctx.bot.flush_prefixes(ctx.guild)
         await ctx.ok()
 
     @prefix.command(name='list')
+    @cached_response('prefixes')
     async def prefix_list(self, ctx: Context):
         """list prefixes"""
         embed = Embed(color=Color.blurple(), title='prefixes')
@@ -89,6 +93,7 @@ class Config(Cog):
         await ctx.send(embed=embed)
 
     @cfg.command(name='schema')
+    @cached_response('schema', per_guild=False)
     async def cfg_schema(self, ctx):
         """lists config keys"""
         if not self.SCHEMA:
@@ -113,6 +118,7 @@ class Config(Cog):
             return await ctx.send(f"that key is not a valid {SCHEMA_PRETTY[schema_type.type]}.")
 
         await ctx.config.set(key, value)
+        await ctx.bot.flush_guild_config(ctx.guild)
         await ctx.send('\N{OK HAND SIGN} set.')
 
 
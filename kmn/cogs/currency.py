@@ -45,6 +45,12 @@ class Currency(Cog):
         self.bot = bot
         self.bank = Bank(bot)
 
+    def export_state(self):
+        return {'storage': self.bank.storage}
+
+    def import_state(self, state):
+        self.bank.storage = state['storage']
+
     @command()
     async def wallet(self, ctx, who: discord.User=None):
         """view your balance"""
@@ -72,6 +72,13 @@ class Exec(Cog):
         self.last_result = None
         self.previous_code = None
 
+    def export_state(self):
+        return {'last_result': self.last_result, 'previous_code': self.previous_code}
+
+    def import_state(self, state):
+        self.last_result = state['last_result']
+        self.previous_code = state['previous_code']
+
     async def execute(self, ctx, code):
         log.info('Eval: %s', code)
 
@@ -1,9 +1,22 @@
+from io import BytesIO
 from time import monotonic
 
+from discord import File
 from discord.ext.commands import command, cooldown, BucketType
 
+from kmn.checks import is_bot_admin
 from kmn.cog import Cog
-from kmn.utils import Timer
+from kmn.formatting import codeblock
+from kmn.members import guild_footprints, users_footprint
+from kmn.utils import Timer, Table, plural
+
+
+def ms(seconds: float) -> str:
+    return f'{seconds * 1000:.2f}ms'
+
+
+def kib(size: int) -> str:
+    return f'{size / 1024:.1f}KiB'
 
 
 class Health(Cog):
@@ -15,6 +28,227 @@ class Health(Cog):
             message = await ctx.send('po—')
         await message.edit(content=f'pong! `{timer}`')
 
+    @command(hidden=True)
+    @is_bot_admin()
+    async def caches(self, ctx):
+        """shows in-process cache statistics"""
+        table = Table('cache', 'size', 'hits', 'misses', 'hit ratio')
+
+        for cache in ctx.bot.caches:
+            table.add_row(
+                cache.name, str(len(cache)), str(cache.hits), str(cache.misses), f'{cache.hit_ratio * 100:.1f}%'
+            )
+
+        await ctx.send(codeblock(table.rendered))
+
+    @command(hidden=True)
+    @is_bot_admin()
+    async def stages(self, ctx):
+        """shows message pipeline stage timings"""
+        pipeline = ctx.bot.pipeline
+        table = Table('stage', 'runs', 'p50', 'p99', 'max', 'slow', 'failed')
+
+        for name in pipeline.stages:
+            histogram = pipeline.histogram(name)
+            table.add_row(
+                name, str(histogram.count), ms(histogram.percentile(50)), ms(histogram.percentile(99)),
+                ms(histogram.max / 1_000_000), str(pipeline.slow[name]), str(pipeline.failures[name])
+            )
+
+        await ctx.send(codeblock(table.rendered))
+
+    @command(hidden=True)
+    @is_bot_admin()
+    async def latency(self, ctx, reset: bool = False):
+        """shows latency percentiles for the message hot path"""
+        table = Table('stage', 'count', 'p50', 'p95', 'p99', 'max')
+
+        for name, histogram in sorted(ctx.bot.metrics.histograms.items()):
+            table.add_row(
+                name, str(histogram.count), ms(histogram.percentile(50)), ms(histogram.percentile(95)),
+                ms(histogram.percentile(99)), ms(histogram.max / 1_000_000)
+            )
+
+        if reset:
+            ctx.bot.metrics.reset()
+
+        await ctx.send(codeblock(table.rendered) + ('\n(window was reset)' if reset else ''))
+
+    @command(hidden=True)
+    @is_bot_admin()
+    async def slowest(self, ctx, amount: int = 10):
+        """lists the slowest commands (across every process)"""
+        await ctx.bot.command_stats.flush()
+        merged = await ctx.bot.command_stats.load()
+
+        if not merged:
+            return await ctx.send('no commands have been run yet.')
+
+        merged.sort(key=lambda stats: stats.latency.percentile(99), reverse=True)
+        table = Table('command', 'runs', 'errors', 'p50', 'p99', 'peak')
+
+        for stats in merged[:amount]:
+            errors = sum(stats.errors.values())
+            error_rate = errors / stats.count * 100 if stats.count else 0.0
+            table.add_row(
+                stats.name, str(stats.count), f'{errors} ({error_rate:.1f}%)', ms(stats.latency.percentile(50)),
+                ms(stats.latency.percentile(99)), str(stats.peak)
+            )
+
+        await ctx.send(codeblock(table.rendered))
+
+    @command(hidden=True)
+    @is_bot_admin()
+    async def stalls(self, ctx, clear: bool = False):
+        """dumps recent event loop stalls"""
+        detector = ctx.bot.stall_detector
+
+        if not detector.stalls:
+            return await ctx.send(f'no stalls over `{detector.threshold * 1000:.0f}ms` recorded. \N{OK HAND SIGN}')
+
+        dump = '\n'.join(stall.format() for stall in reversed(detector.stalls))
+        summary = f'{plural(stall=len(detector.stalls))}, most recent first.'
+
+        if clear:
+            detector.stalls.clear()
+
+        content = f'{summary}\n{codeblock(dump, lang="py")}'
+        if len(content) > 2000:
+            with BytesIO() as bio:
+                bio.write(dump.encode())
+                bio.seek(0)
+                await ctx.send(summary, file=File(bio, 'stalls.txt'))
+        else:
+            await ctx.send(content)
+
+    @command(hidden=True, name='redis')
+    @is_bot_admin()
+    async def redis_stats(self, ctx, reset: bool = False):
+        """shows redis pipelining statistics"""
+        stats = ctx.bot.redis.stats
+
+        table = Table('stat', 'value')
+        table.add_rows(
+            ('pool', f'{ctx.bot.redis.freesize}/{ctx.bot.redis.size} free'),
+            ('commands', str(stats.commands)),
+            ('batches', str(stats.batches)),
+            ('average batch', f'{stats.average_batch:.2f}'),
+            ('largest batch', str(stats.largest_batch)),
+            ('coalesced reads', str(stats.coalesced_reads)),
+            ('average queue wait', f'{stats.average_queue_wait * 1000:.3f}ms'),
+            ('longest queue wait', f'{stats.longest_queue_wait * 1000:.3f}ms')
+        )
+        sizes = ', '.join(f'<={size}: {count}' for size, count in sorted(stats.batch_sizes.items()))
+
+        if reset:
+            stats.reset()
+
+        await ctx.send(codeblock(f'{table.rendered}\n\nbatch sizes: {sizes or "none"}'))
+
+    @command(hidden=True)
+    @is_bot_admin()
+    async def scheduler(self, ctx):
+        """shows command scheduler queues"""
+        scheduler = ctx.bot.scheduler
+        wait = ctx.bot.metrics.histogram('scheduler.wait')
+
+        table = Table('stat', 'value')
+        table.add_rows(
+            ('workers', f'{scheduler.workers} (+{scheduler.priority_workers} priority)'),
+            *((f'{lane} queue', f'{queue.depth} ({plural(guild=len(queue.queues))})')
+              for lane, queue in scheduler.lanes.items()),
+            ('peak queue', str(scheduler.peak_depth)),
+            ('wait p50/p99', f'{ms(wait.percentile(50))} / {ms(wait.percentile(99))}')
+        )
+        running = ', '.join(f'{name}: {count}' for name, count in scheduler.running.most_common())
+
+        await ctx.send(codeblock(f'{table.rendered}\n\nrunning: {running or "nothing"}'))
+
+    @command(hidden=True)
+    @is_bot_admin()
+    async def shedding(self, ctx):
+        """shows recent load shedding episodes"""
+        shedder = ctx.bot.shedder
+        state = 'shedding' if shedder.shedding else 'not shedding'
+
+        if not shedder.episodes:
+            return await ctx.send(f'{state}, no episodes recorded. \N{OK HAND SIGN}')
+
+        # keep it under the message limit
+        dump = '\n'.join(episode.format() for episode in list(reversed(shedder.episodes))[:5])
+        await ctx.send(f'{state}, {plural(episode=len(shedder.episodes))}, most recent first.\n{codeblock(dump)}')
+
+    @command(hidden=True)
+    @is_bot_admin()
+    async def breakers(self, ctx):
+        """shows backend circuit breakers"""
+        table = Table('backend', 'state', 'failures', 'trips', 'timeouts', 'rejected')
+
+        for breaker in ctx.bot.breakers:
+            table.add_row(
+                breaker.name, breaker.state, str(breaker.failures), str(breaker.trips), str(breaker.timeouts),
+                str(breaker.rejected)
+            )
+
+        await ctx.send(codeblock(table.rendered))
+
+    @command(hidden=True)
+    @is_bot_admin()
+    async def outgoing(self, ctx):
+        """shows outgoing message queues"""
+        outgoing = ctx.bot.outgoing
+        wait = ctx.bot.metrics.histogram('outgoing.queue')
+
+        table = Table('stat', 'value')
+        table.add_rows(
+            ('sent', str(outgoing.sent)),
+            ('coalesced', str(outgoing.coalesced)),
+            ('queued', f'{outgoing.depth} ({plural(channel=len(outgoing.queues))})'),
+            ('wait p50/p99', f'{ms(wait.percentile(50))} / {ms(wait.percentile(99))}')
+        )
+
+        await ctx.send(codeblock(table.rendered))
+
+    @command(hidden=True)
+    @is_bot_admin()
+    async def startup(self, ctx):
+        """shows how long each stage of startup took"""
+        startup = ctx.bot.startup
+
+        table = Table('stage', 'time')
+        table.add_rows(*((name, ms(seconds)) for name, seconds in startup.stages.items()))
+        ready = 'not ready yet' if startup.ready_at is None else f'ready in {startup.time_to_ready:.2f}s'
+        lazy = ', '.join(ctx.bot.lazy_stubs) or 'none'
+
+        await ctx.send(codeblock(f'{table.rendered}\n\n{ready}, unloaded lazy cogs: {lazy}'))
+
+    @command(hidden=True)
+    @is_bot_admin()
+    async def memory(self, ctx, amount: int = 10):
+        """shows roughly how much memory each guild takes up"""
+        # these yield to the loop every so often, walking big guilds takes a while
+        footprints = [(guild, size) async for guild, size in guild_footprints(ctx.bot)]
+        users = await users_footprint(ctx.bot)
+        total = sum(size for _, size in footprints)
+        cached = sum(len(guild.members) for guild, _ in footprints)
+
+        table = Table('guild', 'members', 'size', 'per member')
+        for guild, size in sorted(footprints, key=lambda pair: pair[1], reverse=True)[:amount]:
+            table.add_row(
+                guild.name[:30], f'{len(guild.members)}/{guild.member_count}', kib(size),
+                f'{size / max(len(guild.members), 1):.0f}B'
+            )
+
+        policy, fetcher = ctx.bot.member_policy, ctx.bot.member_fetcher
+        summary = (
+            f"{kib(total)} in {plural(guild=len(footprints))} ({kib(total / max(len(footprints), 1))} each, "
+            f"{total / max(cached, 1):.0f}B per cached member), {kib(users)} in {plural(user=len(ctx.bot.users))}\n"
+            f"{'slim' if policy.slim else 'full'} caching: {policy.evicted} offline members evicted, "
+            f"{fetcher.fetched} fetched, {len(fetcher.cache)} held"
+        )
+
+        await ctx.send(codeblock(f'{table.rendered}\n\n{summary}'))
+
 
 def setup(bot):
     bot.add_cog(Health(bot))
@@ -1,44 +1,121 @@
-import discord
-from discord import Message
+import asyncio
+import logging
 
+from kmn.breaker import BackendUnavailable
 from kmn.cog import Cog
-from kmn.guild_config import GuildConfig
+from kmn.pipeline import MessageState, stage
+
+log = logging.getLogger(__name__)
+
+# buffered rows are inserted this many at a time, each batch with this timeout (in seconds)
+FLUSH_BATCH = 500
+FLUSH_TIMEOUT = 30
+
+INSERTION = """
+    INSERT INTO messages
+    (id, content, created_at, author_id, author_tag, author_bot, channel_id, channel_name, guild_id, guild_name)
+    VALUES
+    ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10);
+"""
+
+
+def row(msg) -> tuple:
+    return (
+        # base content
+        msg.id, msg.content, msg.created_at,
+
+        # author
+        msg.author.id, str(msg.author), msg.author.bot,
+
+        # channel
+        msg.channel.id, msg.channel.name,
+
+        # guild
+        msg.guild.id, msg.guild.name
+    )
 
 
 class MessageLogging(Cog):
-    async def on_message(self, msg: Message):
+    def __init__(self, bot):
+        super().__init__(bot)
+
+        # rows held back while shedding load or while postgres is down, inserted in one go later
+        self.buffer = []
+        self.max_buffer = bot.config.get('shedding', {}).get('message_log_buffer', 5000)
+        bot.shedder.register('message_logging', self.flush)
+
+    def export_state(self):
+        # handed over instead of being flushed on unload
+        rows, self.buffer = self.buffer, []
+        return {'buffer': rows}
+
+    def import_state(self, state):
+        self.buffer = state['buffer'] + self.buffer
+
+    def __unload(self):
+        self.bot.shedder.unregister('message_logging')
+        if self.buffer:
+            self.bot.loop.create_task(self.flush())
+
+    @stage()
+    async def log_message(self, state: MessageState):
+        msg = state.message
+
         # sent in a dm
         if not msg.guild:
             return
 
         # only log messages if we are configured to do so
-        config = GuildConfig.for_guild(msg.guild, redis=self.bot.redis)
-        if not await config.is_set('message_logging'):
+        if not await state.is_set('message_logging'):
             return
 
-        insertion = """
-            INSERT INTO messages
-            (id, content, created_at, author_id, author_tag, author_bot, channel_id, channel_name, guild_id, guild_name)
-            VALUES
-            ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10);
-        """
+        if self.bot.shedder.shedding:
+            if self.hold(msg):
+                self.bot.shedder.defer('message_logging')
+            else:
+                self.bot.shedder.drop('message_logging')
+            return
 
-        async with self.bot.postgres.acquire() as conn:
-            await conn.execute(
-                insertion,
+        try:
+            with self.bot.metrics.timed('message.logging_insert'):
+                await self.insert(msg)
+        except BackendUnavailable:
+            # postgres is down, hold on to it until it's back
+            self.hold(msg)
+            return
+
+        # postgres is back, catch up
+        if self.buffer:
+            await self.flush()
 
-                # base content
-                msg.id, msg.content, msg.created_at,
+    def hold(self, msg) -> bool:
+        """Buffers a message to be inserted later. Returns whether there was room for it."""
+        if len(self.buffer) >= self.max_buffer:
+            return False
+        self.buffer.append(row(msg))
+        return True
 
-                # author
-                msg.author.id, str(msg.author), msg.author.bot,
+    async def insert(self, msg):
+        await self.bot.postgres.execute(INSERTION, *row(msg))
+
+    async def flush(self):
+        """Inserts every buffered row, in batches."""
+        rows, self.buffer = self.buffer, []
+        if not rows:
+            return
 
-                # channel
-                msg.channel.id, msg.channel.name,
+        for start in range(0, len(rows), FLUSH_BATCH):
+            try:
+                with self.bot.metrics.timed('message.logging_flush'):
+                    await self.bot.postgres.executemany(INSERTION, rows[start:start + FLUSH_BATCH],
+                                                        timeout=FLUSH_TIMEOUT)
+            except (BackendUnavailable, asyncio.TimeoutError):
+                # try the rest again later
+                self.buffer = (rows[start:] + self.buffer)[:self.max_buffer]
+                log.info('inserted %d of %d buffered messages', start, len(rows))
+                return
 
-                # guild
-                msg.guild.id, msg.guild.name
-            )
+        log.info('inserted %d buffered messages', len(rows))
 
 
 def setup(bot):
@@ -3,10 +3,12 @@ from discord.ext.commands import command
 
 from kmn.cog import Cog
 from kmn.formatting import format_list
+from kmn.responses import cached_response
 
 
 class Meta(Cog):
     @command(aliases=['info'], hidden=True)
+    @cached_response('about', per_guild=False)
     async def about(self, ctx):
         """about me!"""
         server_invite = ctx.bot.config.get('server_invite')
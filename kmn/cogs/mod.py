@@ -1,11 +1,10 @@
 from functools import wraps
 
-import discord
-from discord import Color, Member, HTTPException, Role, Permissions
+from discord import Color, HTTPException, Permissions
 from discord.ext.commands import command, has_permissions, group, bot_has_permissions, guild_only
 
 from kmn.cog import Cog
-from kmn.converters import QuickPermissions
+from kmn.converters import Member, QuickPermissions, Role
 
 
 def prevent_escalate(func):
@@ -36,7 +35,7 @@ class Mod(Cog):
 
     @role.command(name='give')
     @prevent_escalate
-    async def role_give(self, ctx, who: Member, *roles: Role):
+    async def role_give(self, ctx, who: Member(exact=True), *roles: Role(exact=True)):
         """gives someone a role"""
         await who.add_roles(*roles)
         await ctx.ok()
@@ -44,9 +43,9 @@ class Mod(Cog):
     @role.command(name='everyone')
     async def role_everyone(self, ctx):
         """toggles mentionable of pseudo here and everyone roles"""
+        index = ctx.bot.lookup.guild(ctx.guild)
         roles = {
-            discord.utils.get(ctx.guild.roles, name='here'),
-            discord.utils.get(ctx.guild.roles, name='everyone')
+            ctx.guild.get_role(next(iter(index.roles.find(name)), None)) for name in ('here', 'everyone')
         }
 
         if None in roles:
@@ -62,7 +61,7 @@ class Mod(Cog):
 
     @role.command(name='take')
     @prevent_escalate
-    async def role_take(self, ctx, who: Member, *roles: Role):
+    async def role_take(self, ctx, who: Member(exact=True), *roles: Role(exact=True)):
         """takes a role from someone"""
         await who.remove_roles(*roles)
         await ctx.ok()
@@ -71,7 +70,7 @@ class Mod(Cog):
     @guild_only()
     @has_permissions(manage_roles=True)
     async def quickrole(self, ctx, role_name, permissions: QuickPermissions(humanize=True)=None, color: Color=None,
-                        assign_to: Member=None):
+                        assign_to: Member(exact=True)=None):
         """quickly creates a role"""
         role = await ctx.guild.create_role(
             reason=f'quickrole by {ctx.author} ({ctx.author.id})',
@@ -19,10 +19,20 @@ log = logging.getLogger(__name__)
 
 
 class Party(Cog):
+    # parties end themselves, so their destruction tasks have to outlive reloads
+    keep_tasks_on_reload = True
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.parties = []
 
+    def export_state(self):
+        # the same list, so that destruction tasks from before the reload remove their guild from it
+        return {'parties': self.parties}
+
+    def import_state(self, state):
+        self.parties = state['parties']
+
     async def on_member_join(self, member: Member):
         # not a party guild
         if member.guild not in self.parties:
@@ -106,7 +116,7 @@ class Party(Cog):
             await guild.delete()
 
         # party has to end somehow.
-        ctx.bot.loop.create_task(destruction_task())
+        self.create_task(destruction_task())
 
 
 def setup(bot: Bot):
@@ -1,4 +1,6 @@
+import asyncio
 import inspect
+import logging
 import traceback
 
 import datetime
@@ -7,17 +9,40 @@ from discord.ext.commands import errors, command
 from discord.utils import maybe_coroutine
 
 from kmn.bot import Bot
+from kmn.breaker import BackendUnavailable
 from kmn.checks import is_bot_admin
 from kmn.cog import Cog
 from kmn.context import Context
 from kmn.errors import CommandFailure
 
+log = logging.getLogger(__name__)
+
 
 def trace(error: Exception) -> str:
     return ''.join(traceback.format_exception(type(error), error, error.__traceback__, limit=7))
 
 
 class Reporting(Cog):
+    def __init__(self, bot):
+        super().__init__(bot)
+
+        # broadcasts held back while shedding load, sent once the bot recovers
+        self.deferred = []
+        bot.shedder.register('reporting', self.send_deferred)
+
+    def export_state(self):
+        # handed over instead of being sent on unload
+        deferred, self.deferred = self.deferred, []
+        return {'deferred': deferred}
+
+    def import_state(self, state):
+        self.deferred = state['deferred'] + self.deferred
+
+    def __unload(self):
+        self.bot.shedder.unregister('reporting')
+        if self.deferred:
+            self.bot.loop.create_task(self.send_deferred())
+
     async def broadcast(self, stream: str, *args, **kwargs) -> Message:
         """
         Broadcasts a message to a channel specified in the configuration file.
@@ -42,9 +67,41 @@ class Reporting(Cog):
         if not channel:
             raise RuntimeError('Stream channel %s was not found.', stream)
 
-        return await channel.send(*args, **kwargs)
+        return await self.bot.outgoing.send(channel, *args, **kwargs)
+
+    async def broadcast_eventually(self, stream: str, *args, **kwargs):
+        """Broadcasts a message, unless the bot is shedding load, in which case it's sent once the bot recovers."""
+        if self.bot.shedder.shedding:
+            self.deferred.append((stream, args, kwargs))
+            self.bot.shedder.defer('broadcasts')
+            return
+
+        await self.broadcast(stream, *args, **kwargs)
+
+    async def send_deferred(self):
+        deferred, self.deferred = self.deferred, []
+        failed = []
+
+        for index, (stream, args, kwargs) in enumerate(deferred):
+            try:
+                await self.broadcast(stream, *args, **kwargs)
+            except asyncio.CancelledError:
+                # keep whatever wasn't sent yet
+                self.deferred = failed + deferred[index:] + self.deferred
+                raise
+            except Exception:
+                log.exception('failed to send deferred broadcast to %s', stream)
+                failed.append((stream, args, kwargs))
+
+        # one failing doesn't lose the rest, and the ones that failed are tried again after the next episode
+        if failed:
+            self.deferred = failed + self.deferred
 
     async def on_command_error(self, ctx: Context, error: Exception):
+        if ctx.command is not None:
+            original = getattr(error, 'original', error)
+            self.bot.command_stats.get(ctx.command.qualified_name).record_error(type(original).__name__)
+
         # Matcher : { Class | Set<Class> }
         # Handler : String | Coroutine | Function<P1=Exception, RET=String>
         # Handlers : Dict<K=Matcher, V=Handler>
@@ -66,17 +123,21 @@ class Reporting(Cog):
 
             if isinstance(handler, str):
                 # simple string send sending
-                await ctx.send(handler.format(error=error))
+                await ctx.send(handler.format(error=error), coalesce=True)
                 return
             elif callable(handler):
                 # send callable return
-                await ctx.send(await maybe_coroutine(handler, error))
+                await ctx.send(await maybe_coroutine(handler, error), coalesce=True)
                 return
             else:
                 raise TypeError(f'Unknown error handler type: {handler}')
 
         if isinstance(error, errors.CommandInvokeError):
             # :class:`CommandFailure`s should be handled specifically.
+            if isinstance(error.original, BackendUnavailable):
+                await ctx.send("i can't reach my database right now, try again in a bit.")
+                return
+
             if isinstance(error.original, CommandFailure):
                 message = str(error.original).format(prefix=ctx.prefix)
                 await ctx.send(message)
@@ -91,13 +152,13 @@ class Reporting(Cog):
             if ctx.guild:
                 embed.add_field(name='guild', value=f'{ctx.guild.name} `{ctx.guild.id}`')
 
-            await self.broadcast('errors', embed=embed)
+            await self.broadcast_eventually('errors', embed=embed)
 
     async def on_guild_join(self, guild: Guild):
-        await self.broadcast('guilds', f'\N{LARGE BLUE CIRCLE} {guild.name} `{guild.id}`')
+        await self.broadcast_eventually('guilds', f'\N{LARGE BLUE CIRCLE} {guild.name} `{guild.id}`', coalesce=True)
 
     async def on_guild_remove(self, guild: Guild):
-        await self.broadcast('guilds', f'\N{LARGE RED CIRCLE} {guild.name} `{guild.id}`')
+        await self.broadcast_eventually('guilds', f'\N{LARGE RED CIRCLE} {guild.name} `{guild.id}`', coalesce=True)
 
     @command(hidden=True)
     @is_bot_admin()
@@ -8,7 +8,9 @@ from discord.ext.commands import group, command, clean_content
 
 from kmn.checks import is_bot_admin
 from kmn.cog import Cog
+from kmn.converters import Member
 from kmn.errors import CommandFailure
+from kmn.pipeline import MessageState, stage
 from kmn.storage import JSONStorage
 
 
@@ -49,12 +51,28 @@ class Timezone(Cog):
         self.last_message = JSONStorage('_last_message.json', loop=bot.loop)
         self.hour_storage = JSONStorage('_hour_pref.json', loop=bot.loop)
 
-    async def on_message(self, msg):
-        if msg.author.bot:
+    def export_state(self):
+        # the same storages (and locks), so that saves from before and after the reload stay serialized
+        return {'storage': self.storage, 'last_message': self.last_message, 'hour_storage': self.hour_storage}
+
+    def import_state(self, state):
+        self.storage = state['storage']
+        self.last_message = state['last_message']
+        self.hour_storage = state['hour_storage']
+
+    @stage()
+    async def last_seen(self, state: MessageState):
+        if state.author.bot:
+            return
+
+        # this only feeds a heuristic in `sleep`, so it's the first to go under load
+        if self.bot.shedder.shedding:
+            self.bot.shedder.drop('last_seen')
             return
 
         # put
-        await self.last_message.put(str(msg.author.id), time.time())
+        with self.bot.metrics.timed('message.last_seen'):
+            await self.last_message.put(str(state.author.id), time.time())
 
     def time_for(self, who):
         timezone = self.storage.get(str(who.id), None)
@@ -105,7 +123,7 @@ class Timezone(Cog):
         await ctx.send(f'`{raw_timezone}`: {self.format_arrow(time)}')
 
     @command()
-    async def sleep(self, ctx, *, who: discord.Member=None):
+    async def sleep(self, ctx, *, who: Member=None):
         """tells someone to sleep maybe"""
         who = who or ctx.author
 
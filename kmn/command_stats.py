@@ -0,0 +1,138 @@
+import asyncio
+import logging
+from collections import Counter, namedtuple
+
+from kmn.metrics import Histogram
+from kmn.redis import Script
+
+log = logging.getLogger(__name__)
+COMMAND_STATS_KEY = 'kmn:core:command_stats:{0}'
+COMMAND_STATS_INDEX_KEY = 'kmn:core:command_stats'
+
+# KEYS: stats key
+# ARGV: concurrency high-water mark of this process
+PEAK_SCRIPT = Script("""
+local current = tonumber(redis.call('HGET', KEYS[1], 'peak') or '0')
+if tonumber(ARGV[1]) > current then
+  redis.call('HSET', KEYS[1], 'peak', ARGV[1])
+end
+""")
+
+MergedCommandStats = namedtuple('MergedCommandStats', 'name count errors latency peak')
+
+
+class CommandStats:
+    """Invocation statistics for a single command in this process."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latency = Histogram(name)
+        self.errors = Counter()
+        self.active = 0
+        self.peak = 0
+
+        # what hasn't been flushed to redis yet
+        self._pending = Histogram(name)
+        self._pending_errors = Counter()
+
+    def enter(self):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+
+    def exit(self, elapsed: float):
+        self.active -= 1
+        self.latency.record(elapsed)
+        self._pending.record(elapsed)
+
+    def record_error(self, error: str):
+        self.errors[error] += 1
+        self._pending_errors[error] += 1
+
+    def take_pending(self):
+        pending, errors = self._pending, self._pending_errors
+        self._pending, self._pending_errors = Histogram(self.name), Counter()
+        return pending, errors
+
+
+class CommandStatsRegistry:
+    """Keeps :class:`CommandStats` for every command, periodically merging them into Redis hashes.
+
+    Every process adds its own deltas with ``HINCRBY``, so the numbers in Redis are the sum across every process and
+    survive restarts.
+    """
+
+    def __init__(self, redis, *, interval: float = 60):
+        self.redis = redis
+        self.interval = interval
+        self.stats = {}
+
+    def get(self, name: str) -> CommandStats:
+        stats = self.stats.get(name)
+        if stats is None:
+            stats = self.stats[name] = CommandStats(name)
+        return stats
+
+    async def flush(self):
+        breaker = getattr(self.redis, 'breaker', None)
+
+        for stats in list(self.stats.values()):
+            # nothing would be sent, so keep the deltas around for when redis is back
+            if breaker is not None and breaker.is_open:
+                return
+
+            pending, errors = stats.take_pending()
+
+            if not pending.count and not errors:
+                continue
+
+            key = COMMAND_STATS_KEY.format(stats.name)
+            increments = {'count': pending.count, 'total': pending.total}
+            increments.update((f'error:{error}', count) for error, count in errors.items())
+            increments.update((f'bucket:{index}', count) for index, count in pending.buckets())
+
+            # once sent, these may have been applied even if we never hear back (timeouts), so they aren't retried:
+            # losing a few deltas beats counting them twice
+            await asyncio.gather(
+                self.redis.sadd(COMMAND_STATS_INDEX_KEY, stats.name),
+                PEAK_SCRIPT(self.redis, keys=[key], args=[stats.peak]),
+                *(self.redis.hincrby(key, field, value) for field, value in increments.items() if value)
+            )
+
+    async def load(self):
+        """Loads the statistics of every command, merged across processes."""
+        names = await self.redis.smembers(COMMAND_STATS_INDEX_KEY, encoding='utf-8')
+        hashes = await asyncio.gather(
+            *(self.redis.hgetall(COMMAND_STATS_KEY.format(name), encoding='utf-8') for name in names)
+        )
+
+        merged = []
+
+        for name, fields in zip(names, hashes):
+            latency = Histogram(name)
+            errors = Counter()
+
+            for field, value in fields.items():
+                if field.startswith('bucket:'):
+                    latency.record_bucket(int(field[7:]), int(value))
+                elif field.startswith('error:'):
+                    errors[field[6:]] = int(value)
+
+            latency.total = int(fields.get('total', 0))
+            merged.append(MergedCommandStats(
+                name=name, count=int(fields.get('count', 0)), errors=errors, latency=latency,
+                peak=int(fields.get('peak', 0))
+            ))
+
+        return merged
+
+    async def run(self):
+        """Flushes statistics forever."""
+        while True:
+            await asyncio.sleep(self.interval)
+
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception('failed to flush command stats')
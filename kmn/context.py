@@ -4,6 +4,8 @@ Custom command context for kmn.
 Most of the database-management code was stolen from Danny (@Rapptz on GitHub). Thanks!
 """
 
+import asyncio
+
 from discord import Color, Embed, HTTPException
 from discord.ext.commands import Context as DiscordContext
 
@@ -42,16 +44,21 @@ class Context(DiscordContext):
         # database connection
         self.db = None
 
+    async def send(self, content=None, *, coalesce: bool = False, **kwargs):
+        """Sends a message through the outgoing message queues (see :class:`kmn.outgoing.OutgoingMessages`)."""
+        return await self.bot.outgoing.send(self.channel, content, coalesce=coalesce, **kwargs)
+
     async def ok(self, emoji='\N{OK HAND SIGN}'):
+        # built lazily, so that we don't leave the fallbacks unawaited
         chain = [
-            self.message.add_reaction(emoji),
-            self.send(emoji),
-            self.author.send(emoji)
+            lambda: self.message.add_reaction(emoji),
+            lambda: self.send(emoji, coalesce=True),
+            lambda: self.author.send(emoji)
         ]
 
-        for coro in chain:
+        for attempt in chain:
             try:
-                await coro
+                await attempt()
             except HTTPException:
                 pass
             else:
@@ -78,7 +85,8 @@ class Context(DiscordContext):
             await self.bot.postgres.release(self.db)
             self.db = None
 
-    async def confirm(self, **kwargs):
+    async def confirm(self, *, timeout: float = 60, **kwargs):
+        """Asks for confirmation through reactions. Nobody answering within ``timeout`` seconds counts as a no."""
         embed = Embed(**kwargs, color=Color.red())
 
         # send embed
@@ -103,9 +111,19 @@ class Context(DiscordContext):
         def _check(added_reaction, user):
             return user == self.author and added_reaction.message.channel == self.channel
 
-        # wait for reaction
+        # wait for reaction. commands hold a scheduler worker while they run, so this can't go on forever
+        deadline = self.bot.loop.time() + timeout
         while True:
-            reaction, adder = await self.bot.wait_for('reaction_add', check=_check)
+            try:
+                reaction, adder = await self.bot.wait_for(
+                    'reaction_add', check=_check, timeout=max(0.0, deadline - self.bot.loop.time())
+                )
+            except asyncio.TimeoutError:
+                try:
+                    await message.delete()
+                except HTTPException:
+                    pass
+                return False
 
             # ignore custom emoji
             if not isinstance(reaction.emoji, str):
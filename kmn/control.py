@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import time
+from uuid import uuid4
+
+from kmn.breaker import BackendUnavailable
+
+log = logging.getLogger(__name__)
+CONTROL_CHANNEL = 'kmn:core:control'
+
+
+class Reply:
+    __slots__ = ('process', 'result', 'error', 'duration')
+
+    def __init__(self, process, result=None, error=None, duration=0.0):
+        self.process = process
+        self.result = result
+        self.error = error
+        self.duration = duration
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def to_dict(self) -> dict:
+        return {'process': self.process, 'result': self.result, 'error': self.error, 'duration': self.duration}
+
+
+class Gathered:
+    """The replies to a broadcast. ``missing`` processes didn't reply in time."""
+
+    def __init__(self, replies, *, missing: int = 0, isolated: bool = False):
+        self.replies = replies
+        self.missing = missing
+
+        # whether redis was unreachable, so only this process was asked
+        self.isolated = isolated
+
+    def __iter__(self):
+        return iter(self.replies)
+
+    @property
+    def results(self) -> list:
+        return [reply.result for reply in self.replies if reply.ok]
+
+    def describe(self) -> str:
+        """Describes who didn't reply, if anyone."""
+        if self.isolated:
+            return "couldn't reach the other processes"
+        if self.missing:
+            return f"{self.missing} process{'es' if self.missing != 1 else ''} didn't reply in time"
+        return ''
+
+
+class _Waiting:
+    def __init__(self):
+        self.replies = []
+        self.expected = None
+        self.done = asyncio.Event()
+
+    def check(self):
+        if self.expected is not None and len(self.replies) >= self.expected:
+            self.done.set()
+
+
+class ControlPlane:
+    """Fans operations out to every process through Redis pub/sub, and gathers the replies.
+
+    Operations are registered by name with a coroutine function, which is called with the keyword arguments that were
+    broadcast and returns something that can be serialized to JSON. Every process runs the operation (the one that
+    broadcast it directly) and replies. The broadcaster waits for as many replies as there were other subscribers when
+    it published, or until the timeout.
+    """
+
+    def __init__(self, redis, *, loop, name: str, timeout: float = 5.0):
+        self.redis = redis
+        self.loop = loop
+        self.name = name
+        self.timeout = timeout
+
+        # names are for humans, this is what tells processes apart
+        self.id = uuid4().hex
+
+        self.handlers = {}
+        self.listening = False
+        self._waiting = {}
+
+    def register(self, operation: str, handler):
+        self.handlers[operation] = handler
+
+    def unregister(self, operation: str):
+        self.handlers.pop(operation, None)
+
+    async def _run(self, operation: str, args: dict) -> Reply:
+        handler = self.handlers.get(operation)
+        if handler is None:
+            return Reply(self.name, error=f'unknown operation {operation!r}')
+
+        started = time.perf_counter()
+        try:
+            result = await handler(**args)
+        except Exception as error:
+            log.exception('control operation %s failed', operation)
+            return Reply(self.name, error=f'{type(error).__name__}: {error}', duration=time.perf_counter() - started)
+
+        return Reply(self.name, result, duration=time.perf_counter() - started)
+
+    async def broadcast(self, operation: str, *, timeout: float = None, **args) -> Gathered:
+        """Runs an operation in every process, and gathers the replies."""
+        request = uuid4().hex
+        waiting = self._waiting[request] = _Waiting()
+
+        try:
+            try:
+                with await self.redis as conn:
+                    receivers = await conn.publish_json(CONTROL_CHANNEL, {
+                        'type': 'request', 'id': request, 'origin': self.id, 'operation': operation, 'args': args
+                    })
+            except BackendUnavailable:
+                log.warning('redis is unavailable, running %s in this process only', operation)
+                return Gathered([await self._run(operation, args)], isolated=True)
+
+            # that count includes our own subscription, but we run the operation directly instead
+            waiting.expected = max(0, receivers - (1 if self.listening else 0))
+            waiting.check()
+
+            local = await self._run(operation, args)
+
+            try:
+                await asyncio.wait_for(waiting.done.wait(), timeout or self.timeout)
+            except asyncio.TimeoutError:
+                pass
+
+            replies = list(waiting.replies)
+            return Gathered([local] + replies, missing=max(0, waiting.expected - len(replies)))
+        finally:
+            del self._waiting[request]
+
+    async def _answer(self, message: dict):
+        reply = await self._run(message['operation'], message['args'])
+
+        try:
+            with await self.redis as conn:
+                await conn.publish_json(CONTROL_CHANNEL, {
+                    'type': 'reply', 'id': message['id'], 'origin': self.id, 'reply': reply.to_dict()
+                })
+        except BackendUnavailable:
+            log.warning("couldn't reply to %s, redis is unavailable", message['operation'])
+
+    def _dispatch(self, message: dict):
+        if message['origin'] == self.id:
+            return
+
+        if message['type'] == 'request':
+            self.loop.create_task(self._answer(message))
+            return
+
+        waiting = self._waiting.get(message['id'])
+        if waiting is not None:
+            waiting.replies.append(Reply(**message['reply']))
+            waiting.check()
+
+    async def listen(self):
+        """Listens for operations (and replies) forever. This holds a dedicated connection."""
+        while True:
+            conn = None
+
+            try:
+                conn = await self.redis.acquire()
+                channel, = await conn.subscribe(CONTROL_CHANNEL)
+                self.listening = True
+                log.info('listening for control operations as %s', self.name)
+
+                while await channel.wait_message():
+                    self._dispatch(await channel.get_json())
+
+                log.warning('control channel closed, resubscribing in 5s')
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception('control listener failed, resubscribing in 5s')
+            finally:
+                self.listening = False
+                # subscribed connections are closed on release
+                if conn is not None:
+                    self.redis.release(conn)
+
+            await asyncio.sleep(5)
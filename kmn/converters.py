@@ -1,5 +1,7 @@
+import re
+
 from discord import Permissions
-from discord.ext.commands import Converter, BadArgument
+from discord.ext.commands import Converter, BadArgument, MemberConverter, NoPrivateMessage
 
 
 class QuickPermissions(Converter):
@@ -21,3 +23,86 @@ class QuickPermissions(Converter):
             setattr(permissions, key.strip(), True)
 
         return permissions
+
+
+MENTION_OR_ID = re.compile(r'<@!?([0-9]{15,21})>$|([0-9]{15,21})$')
+ROLE_MENTION_OR_ID = re.compile(r'<@&([0-9]{15,21})>$|([0-9]{15,21})$')
+
+
+def _id_of(pattern, argument: str):
+    match = pattern.match(argument)
+    return None if match is None else int(match.group(1) or match.group(2))
+
+
+def _ambiguous(kind: str, argument: str, names) -> BadArgument:
+    return BadArgument(f'"{argument}" could be more than one {kind}: {", ".join(names)}')
+
+
+class Member(MemberConverter):
+    """Converts to a member through the guild's index (see :mod:`kmn.lookup`), fetching members that aren't cached.
+
+    Tags, names and nicknames are matched exactly, and if nothing matches, by prefix as long as that's unambiguous
+    (unless ``exact``, which commands that change something about the member should use).
+    """
+
+    def __init__(self, *, exact=False):
+        self.exact = exact
+
+    async def convert(self, ctx, argument):
+        if ctx.guild is None:
+            return await super().convert(ctx, argument)
+
+        id = _id_of(MENTION_OR_ID, argument)
+        ids = [id] if id is not None else ctx.bot.lookup.guild(ctx.guild).find(argument, exact=self.exact)
+
+        if len(ids) > 1:
+            raise _ambiguous('member', argument, (str(ctx.guild.get_member(id) or id) for id in ids))
+
+        # the index also knows members that were evicted from the cache (see kmn.members)
+        member = await ctx.bot.member_fetcher.get(ctx.guild, ids[0]) if ids else None
+        if member is None:
+            raise BadArgument(f'member "{argument}" not found.')
+        return member
+
+
+class Role(Converter):
+    """Converts to a role through the guild's index (see :mod:`kmn.lookup`), also matching unambiguous prefixes unless
+    ``exact``."""
+
+    def __init__(self, *, exact=False):
+        self.exact = exact
+
+    async def convert(self, ctx, argument):
+        if ctx.guild is None:
+            raise NoPrivateMessage()
+
+        id = _id_of(ROLE_MENTION_OR_ID, argument)
+        ids = [id] if id is not None else ctx.bot.lookup.guild(ctx.guild).find_role(argument, exact=self.exact)
+        roles = [role for role in map(ctx.guild.get_role, ids) if role is not None]
+
+        if not roles:
+            raise BadArgument(f'role "{argument}" not found.')
+        if len(roles) > 1:
+            raise _ambiguous('role', argument, (role.name for role in roles))
+        return roles[0]
+
+
+class User(Converter):
+    """Converts to a user through the user index (see :mod:`kmn.lookup`), also matching unambiguous prefixes unless
+    ``exact``."""
+
+    def __init__(self, *, exact=False):
+        self.exact = exact
+
+    async def convert(self, ctx, argument):
+        id = _id_of(MENTION_OR_ID, argument)
+        ids = [id] if id is not None else ctx.bot.lookup.users().find(argument, exact=self.exact)
+
+        # users that aren't around anymore stay in the index
+        users = [user for user in map(ctx.bot.get_user, ids) if user is not None]
+
+        if not users:
+            raise BadArgument(f'user "{argument}" not found.')
+        if len(users) > 1:
+            raise _ambiguous('user', argument, (str(user) for user in users))
+        return users[0]
@@ -2,11 +2,31 @@ import inspect
 import itertools
 from discord.ext.commands import HelpFormatter, Paginator, Command
 
+from kmn.responses import permission_key
+
 
 class Formatter(HelpFormatter):
     def get_ending_note(self):
         return ''
 
+    async def format_help_for(self, context, command_or_bot):
+        # what people can see depends on the checks they pass, and signatures show the prefix that was used
+        cache = context.bot.responses
+        if command_or_bot is context.bot:
+            target = None
+        elif isinstance(command_or_bot, Command):
+            target = ('command', command_or_bot.qualified_name)
+        else:
+            target = ('cog', type(command_or_bot).__name__)
+        key = cache.key('help', context, (target, context.prefix), vary=permission_key(context))
+
+        pages = cache.get(key)
+        if pages is None:
+            pages = await super().format_help_for(context, command_or_bot)
+            cache.put(key, pages, tags=('help', 'prefixes'))
+
+        return list(pages)
+
     async def format(self):
         """Handles the actual behaviour involved with formatting.
 
@@ -1,6 +1,18 @@
 GUILD_KEY = 'guild_config:{0.id}:{1}'
 
 
+def is_enabled(value) -> bool:
+    """Checks if a raw configuration value counts as "set"."""
+    if value is None:
+        return False
+
+    if isinstance(value, bytes):
+        value = value.decode()
+
+    # disabled
+    return value not in {'off', 'false'}
+
+
 class GuildConfig:
     """An object that manages the configuration of this guild through Redis."""
 
@@ -19,18 +31,7 @@ class GuildConfig:
 
     async def is_set(self, key):
         with await self.redis as conn:
-            result = (await conn.get(GUILD_KEY.format(self.guild, key)))
-
-            if result is None:
-                return False
-
-            result = result.decode()
-
-            # disabled
-            if result in {'off', 'false'}:
-                return False
-
-            return True
+            return is_enabled(await conn.get(GUILD_KEY.format(self.guild, key)))
 
     async def get(self, key, *, cast=None):
         with await self.redis as conn:
@@ -0,0 +1,69 @@
+import asyncio
+import logging
+
+log = logging.getLogger(__name__)
+INVALIDATION_CHANNEL = 'kmn:core:invalidate'
+
+
+class Invalidator:
+    """Keeps in-process caches coherent across processes through Redis pub/sub.
+
+    Handlers are registered by cache name and are called with the (string) key that was invalidated. Invalidations are
+    applied locally straight away, and then published so that every other process can do the same.
+    """
+
+    def __init__(self, redis, *, loop):
+        self.redis = redis
+        self.loop = loop
+        self.handlers = {}
+
+    def register(self, cache: str, handler):
+        self.handlers[cache] = handler
+
+    def unregister(self, cache: str):
+        self.handlers.pop(cache, None)
+
+    def _dispatch(self, cache: str, key: str):
+        handler = self.handlers.get(cache)
+
+        if handler is None:
+            return
+
+        try:
+            handler(key)
+        except Exception:
+            log.exception('failed to invalidate %s:%s', cache, key)
+
+    async def publish(self, cache: str, key):
+        """Invalidates a key locally and in every other process."""
+        key = str(key)
+        self._dispatch(cache, key)
+
+        with await self.redis as conn:
+            await conn.publish_json(INVALIDATION_CHANNEL, {'cache': cache, 'key': key})
+
+    async def listen(self):
+        """Listens for invalidations forever. This holds a dedicated connection."""
+        while True:
+            conn = None
+
+            try:
+                conn = await self.redis.acquire()
+                channel, = await conn.subscribe(INVALIDATION_CHANNEL)
+                log.info('listening for invalidations')
+
+                while await channel.wait_message():
+                    message = await channel.get_json()
+                    self._dispatch(message['cache'], message['key'])
+
+                log.warning('invalidation channel closed, resubscribing in 5s')
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception('invalidation listener failed, resubscribing in 5s')
+            finally:
+                # subscribed connections are closed on release
+                if conn is not None:
+                    self.redis.release(conn)
+
+            await asyncio.sleep(5)
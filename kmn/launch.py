@@ -0,0 +1,79 @@
+"""
+Connecting to the backends and running a bot, shared by the launcher and the cluster workers.
+"""
+
+import asyncio
+import signal
+
+import aioredis
+import asyncpg
+
+from kmn.bot import Bot
+from kmn.metrics_server import MetricsServer
+from kmn.startup import StartupTimings
+
+
+async def retry(factory, *, exceptions, notice, delay=0.1, max_delay=5.0):
+    while True:
+        try:
+            return await factory()
+        except exceptions:
+            print('Notice:', notice.format(delay=delay))
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, max_delay)
+
+
+async def connect_postgres(config, startup: StartupTimings):
+    # repeatedly attempt to connect to postgres.
+    with startup.stage('postgres'):
+        return await retry(
+            lambda: asyncpg.create_pool(**config['postgres']),
+            exceptions=(ConnectionRefusedError, asyncpg.CannotConnectNowError),
+            notice='Cannot connect to Postgres, retrying in {delay:.1f}s.'
+        )
+
+
+async def connect_redis(config, startup: StartupTimings):
+    with startup.stage('redis'):
+        return await retry(
+            lambda: aioredis.create_pool(
+                (config['redis']['host'], config['redis']['port']),
+                db=config['redis'].get('db', 0)
+            ),
+            exceptions=OSError,
+            notice='Cannot connect to Redis, retrying in {delay:.1f}s.'
+        )
+
+
+async def launch(config, startup: StartupTimings, *, bot_class=Bot, metrics_port: int = None, **options):
+    """Connects to the backends, then runs a bot until it is closed. Extra options are passed to the bot."""
+    pool, redis = await asyncio.gather(connect_postgres(config, startup), connect_redis(config, startup))
+
+    with startup.stage('bot'):
+        bot = bot_class(config=config, postgres=pool, redis=redis, startup=startup, **options)
+
+    # warm up the caches before the gateway starts sending us messages
+    with startup.stage('snapshot'):
+        bot.restore_snapshot()
+
+    # shut down cleanly (and save the snapshot) when asked to stop, e.g. by the cluster supervisor
+    try:
+        bot.loop.add_signal_handler(signal.SIGTERM, lambda: bot.loop.create_task(bot.close()))
+    except NotImplementedError:
+        pass
+
+    # optionally expose metrics on localhost
+    metrics_server = None
+    if 'metrics' in config:
+        metrics_options = dict(config['metrics'])
+        if metrics_port is not None:
+            metrics_options['port'] = metrics_port
+        metrics_server = MetricsServer(bot, **metrics_options)
+        await metrics_server.start()
+
+    try:
+        startup.begin('gateway')
+        await bot.start(config['token'])
+    finally:
+        if metrics_server is not None:
+            await metrics_server.stop()
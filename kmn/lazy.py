@@ -0,0 +1,22 @@
+from discord.ext.commands import command
+
+# rarely used cogs that can be loaded on first use instead of on startup, with stubs for the commands they provide:
+# (name, aliases, brief). stubs without a brief are hidden from help.
+LAZY_COGS = {
+    'util': [('whois', (), 'runs a whois on a domain')],
+    'eval': [('eval', ('exec', 'debug'), None), ('retry', (), None)],
+    'party': [('party', (), None)]
+}
+
+
+def make_stub(extension: str, name: str, aliases, brief):
+    """Creates a stand-in command that causes an extension to be loaded when invoked (see :meth:`Bot.invoke`)."""
+    async def stub(ctx):
+        # never actually called, the bot swaps in the real command first
+        pass
+
+    stub_command = command(
+        name=name, aliases=list(aliases), brief=brief, help=brief or 'loaded on first use', hidden=brief is None
+    )(stub)
+    stub_command.lazy_extension = extension
+    return stub_command
@@ -0,0 +1,152 @@
+"""
+Logging setup for the launcher.
+
+In queue mode, records are put onto a bounded queue by the event loop thread and written out by a dedicated thread.
+When the queue is full, records are dropped (and counted) instead of blocking, so logging can never stall the loop.
+"""
+
+import json
+import logging
+import random
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+from queue import Queue, Full
+
+FORMAT = '[{asctime}] [{levelname: <7}] {name}: {message}'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats records as single-line JSON objects."""
+
+    def format(self, record):
+        entry = {
+            'time': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'thread': record.threadName
+        }
+
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+
+        return json.dumps(entry)
+
+
+def _match_logger(rules: dict, name: str):
+    """Finds the rule for the most specific logger that ``name`` is (or is a child of)."""
+    while name:
+        if name in rules:
+            return rules[name]
+        name = name.rpartition('.')[0]
+    return None
+
+
+class RateLimitFilter(logging.Filter):
+    """Rate limits and/or samples hot loggers.
+
+    ``rate_limits`` maps logger names to the amount of records per second that are let through (a token bucket), and
+    ``sample`` maps logger names to the fraction of records that are let through. Warnings and above are never
+    filtered.
+    """
+
+    def __init__(self, *, rate_limits: dict = None, sample: dict = None):
+        super().__init__()
+        self.rate_limits = rate_limits or {}
+        self.sample = sample or {}
+
+        # logger name -> [tokens, last refill]
+        self._buckets = {}
+        self.suppressed = 0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+
+        fraction = _match_logger(self.sample, record.name)
+        if fraction is not None and random.random() >= fraction:
+            self.suppressed += 1
+            return False
+
+        rate = _match_logger(self.rate_limits, record.name)
+        if rate is None:
+            return True
+
+        now = time.monotonic()
+        bucket = self._buckets.get(record.name)
+        if bucket is None:
+            bucket = self._buckets[record.name] = [rate, now]
+
+        bucket[0] = min(rate, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+
+        if bucket[0] < 1:
+            self.suppressed += 1
+            return False
+
+        bucket[0] -= 1
+        return True
+
+
+class DroppingQueueHandler(QueueHandler):
+    """A queue handler that drops records instead of blocking when the queue is full."""
+
+    def __init__(self, queue):
+        super().__init__(queue)
+        self.dropped = 0
+        self._unreported = 0
+
+    def prepare(self, record):
+        # formatting happens on the listener thread
+        return record
+
+    def enqueue(self, record):
+        if self._unreported:
+            notice = logging.LogRecord(
+                __name__, logging.WARNING, __file__, 0, 'dropped %d log records, the queue was full', (self._unreported,),
+                None
+            )
+
+            try:
+                self.queue.put_nowait(notice)
+                self._unreported = 0
+            except Full:
+                pass
+
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            self.dropped += 1
+            self._unreported += 1
+
+
+def setup_logging(options: dict):
+    """Sets up logging. Returns the queue listener, which should be stopped on exit, if queue mode is enabled."""
+    root_logger = logging.getLogger()
+    root_logger.setLevel(logging.INFO)
+    kmn_logger = logging.getLogger('kmn')
+    kmn_logger.setLevel(logging.DEBUG)
+
+    stream = logging.StreamHandler(sys.stdout)
+    if options.get('json', False):
+        stream.setFormatter(JSONFormatter())
+    else:
+        stream.setFormatter(logging.Formatter(FORMAT, DATE_FORMAT, style='{'))
+
+    listener = None
+
+    if options.get('queue', False):
+        queue = Queue(maxsize=options.get('queue_size', 10000))
+        handler = DroppingQueueHandler(queue)
+        listener = QueueListener(queue, stream, respect_handler_level=True)
+        listener.start()
+    else:
+        handler = stream
+
+    if 'rate_limits' in options or 'sample' in options:
+        handler.addFilter(RateLimitFilter(rate_limits=options.get('rate_limits'), sample=options.get('sample')))
+
+    root_logger.addHandler(handler)
+    return listener
@@ -0,0 +1,261 @@
+"""
+Indexes for finding members, roles and users by name.
+
+discord.py's converters find things by name by scanning every member (or role, or user), which adds up in big guilds.
+These indexes are sorted lists of ``(casefolded name, id)``, so exact and prefix lookups are binary searches. A guild's
+indexes are built the first time they're needed, and kept up to date from events after that.
+"""
+
+import logging
+import time
+from bisect import bisect_left, insort
+
+from kmn.members import wrap_parser
+
+log = logging.getLogger(__name__)
+
+
+def _tag(user) -> str:
+    return f'{user.name}#{user.discriminator}'
+
+
+class NameIndex:
+    """Maps names to ids. Lookups are by exact name (preferring the same case) or by prefix, case-insensitively."""
+
+    def __init__(self, pairs=()):
+        # id -> name, as given
+        self._names = {}
+        for id, name in pairs:
+            if name:
+                self._names[id] = name
+
+        # sorted (folded name, id)
+        self._entries = sorted((name.casefold(), id) for id, name in self._names.items())
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, id: int):
+        return id in self._names
+
+    def add(self, id: int, name: str):
+        self.remove(id)
+        if not name:
+            return
+        self._names[id] = name
+        insort(self._entries, (name.casefold(), id))
+
+    def remove(self, id: int):
+        name = self._names.pop(id, None)
+        if name is None:
+            return
+
+        entry = (name.casefold(), id)
+        index = bisect_left(self._entries, entry)
+        if index < len(self._entries) and self._entries[index] == entry:
+            del self._entries[index]
+
+    def _scan(self, folded: str, *, prefix: bool):
+        entries = self._entries
+        index = bisect_left(entries, (folded,))
+
+        while index < len(entries):
+            name, id = entries[index]
+            if name != folded and not (prefix and name.startswith(folded)):
+                return
+            yield id
+            index += 1
+
+    def find(self, name: str) -> list:
+        """Ids with this name. If some match the case exactly, only those."""
+        ids = list(self._scan(name.casefold(), prefix=False))
+        return [id for id in ids if self._names[id] == name] or ids
+
+    def starting_with(self, prefix: str, *, limit: int = 10) -> list:
+        ids = []
+        for id in self._scan(prefix.casefold(), prefix=True):
+            ids.append(id)
+            if len(ids) >= limit:
+                break
+        return ids
+
+
+class TagIndex:
+    """Maps ``name#discriminator`` to ids."""
+
+    def __init__(self, users=()):
+        self._ids = {_tag(user): user.id for user in users}
+        self._tags = {id: tag for tag, id in self._ids.items()}
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, user):
+        self.remove(user.id)
+        tag = self._tags[user.id] = _tag(user)
+        self._ids[tag] = user.id
+
+    def remove(self, id: int):
+        tag = self._tags.pop(id, None)
+        if tag is not None and self._ids.get(tag) == id:
+            del self._ids[tag]
+
+    def get(self, tag: str):
+        return self._ids.get(tag)
+
+
+class UserIndex:
+    def __init__(self, users):
+        users = list(users)
+        self.names = NameIndex((user.id, user.name) for user in users)
+        self.tags = TagIndex(users)
+
+    def add(self, user):
+        self.names.add(user.id, user.name)
+        self.tags.add(user)
+
+    def find(self, argument: str, *, exact: bool = False, limit: int = 10) -> list:
+        """Ids of users matching a tag or a name exactly, or failing that (unless ``exact``), those with names starting
+        with it."""
+        if len(argument) > 5 and argument[-5] == '#':
+            id = self.tags.get(argument)
+            if id is not None:
+                return [id]
+
+        found = self.names.find(argument)[:1]
+        if found or exact:
+            return found
+        return self.names.starting_with(argument, limit=limit)
+
+
+class GuildIndex(UserIndex):
+    """Members of a guild by name, nickname and tag, and roles by name."""
+
+    def __init__(self, guild):
+        members = list(guild.members)
+        super().__init__(members)
+        self.nicks = NameIndex((member.id, member.nick) for member in members)
+        self.roles = NameIndex((role.id, role.name) for role in guild.roles)
+
+    def add(self, member):
+        super().add(member)
+        self.nicks.add(member.id, member.nick)
+
+    def remove(self, id: int):
+        self.names.remove(id)
+        self.nicks.remove(id)
+        self.tags.remove(id)
+
+    def find(self, argument: str, *, exact: bool = False, limit: int = 10) -> list:
+        if len(argument) > 5 and argument[-5] == '#':
+            id = self.tags.get(argument)
+            if id is not None:
+                return [id]
+
+        found = (self.names.find(argument) or self.nicks.find(argument))[:1]
+        if found or exact:
+            return found
+
+        # a name and a nick can both match, keep the order stable
+        ids = self.names.starting_with(argument, limit=limit) + self.nicks.starting_with(argument, limit=limit)
+        return list(dict.fromkeys(ids))[:limit]
+
+    def find_role(self, argument: str, *, exact: bool = False, limit: int = 10) -> list:
+        found = self.roles.find(argument)[:1]
+        if found or exact:
+            return found
+        return self.roles.starting_with(argument, limit=limit)
+
+
+class Lookup:
+    """Per-guild member and role indexes, and an index of users, built on first use and maintained from events."""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._guilds = {}
+        self._users = None
+
+    def guild(self, guild) -> GuildIndex:
+        index = self._guilds.get(guild.id)
+        if index is None:
+            started = time.perf_counter()
+            index = self._guilds[guild.id] = GuildIndex(guild)
+            log.debug('indexed %d members of %d in %.2fms', len(index.names), guild.id,
+                      (time.perf_counter() - started) * 1000)
+        return index
+
+    def users(self) -> UserIndex:
+        if self._users is None:
+            self._users = UserIndex(self.bot.users)
+        return self._users
+
+    def install(self, state):
+        """Keeps up with members that get cached without a join event."""
+        wrap_parser(state, 'presence_update', after=self._presence_updated)
+        wrap_parser(state, 'guild_members_chunk', after=self._chunked)
+
+    def _presence_updated(self, state, data):
+        index = self._guilds.get(int(data.get('guild_id') or 0))
+        if index is None:
+            return
+
+        # members show up through presence updates too (and come back through them, in slim mode)
+        guild = state._get_guild(int(data['guild_id']))
+        member = guild.get_member(int(data['user']['id'])) if guild is not None else None
+        if member is not None and member.id not in index.names:
+            index.add(member)
+
+    def _chunked(self, state, data):
+        # a chunk is a lot of members at once, rebuilding when it's next needed is cheaper
+        self._guilds.pop(int(data['guild_id']), None)
+
+    def listeners(self):
+        return [
+            self.on_member_join, self.on_member_remove, self.on_member_update, self.on_user_update,
+            self.on_guild_role_create, self.on_guild_role_delete, self.on_guild_role_update, self.on_guild_remove,
+            self.on_guild_available, self.on_guild_unavailable
+        ]
+
+    async def on_member_join(self, member):
+        if member.guild.id in self._guilds:
+            self._guilds[member.guild.id].add(member)
+        if self._users is not None:
+            self._users.add(member)
+
+    async def on_member_remove(self, member):
+        if member.guild.id in self._guilds:
+            self._guilds[member.guild.id].remove(member.id)
+
+    async def on_member_update(self, before, after):
+        if (before.name, before.discriminator, before.nick) == (after.name, after.discriminator, after.nick):
+            return
+
+        if after.guild.id in self._guilds:
+            self._guilds[after.guild.id].add(after)
+        await self.on_user_update(before, after)
+
+    async def on_user_update(self, before, after):
+        if self._users is not None and (before.name, before.discriminator) != (after.name, after.discriminator):
+            self._users.add(after)
+
+    async def on_guild_role_create(self, role):
+        if role.guild.id in self._guilds:
+            self._guilds[role.guild.id].roles.add(role.id, role.name)
+
+    async def on_guild_role_delete(self, role):
+        if role.guild.id in self._guilds:
+            self._guilds[role.guild.id].roles.remove(role.id)
+
+    async def on_guild_role_update(self, before, after):
+        if before.name != after.name:
+            await self.on_guild_role_create(after)
+
+    async def on_guild_remove(self, guild):
+        self._guilds.pop(guild.id, None)
+
+    async def on_guild_available(self, guild):
+        # its members were replaced wholesale
+        self._guilds.pop(guild.id, None)
+
+    async def on_guild_unavailable(self, guild):
+        self._guilds.pop(guild.id, None)
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+
+class LagSampler:
+    """Continuously samples how late the event loop is at waking up a sleeping coroutine."""
+
+    def __init__(self, *, loop, metrics, interval: float = 0.5):
+        self.loop = loop
+        self.interval = interval
+        self.histogram = metrics.histogram('loop.lag')
+
+        # the most recent sample, in seconds
+        self.lag = 0.0
+
+    async def run(self):
+        while True:
+            started = self.loop.time()
+            await asyncio.sleep(self.interval)
+            self.lag = max(0.0, self.loop.time() - started - self.interval)
+            self.histogram.record(self.lag)
+
+
+class Stall:
+    """A period of time where a single callback held the event loop."""
+
+    __slots__ = ('started_at', 'duration', 'task', 'stack')
+
+    def __init__(self, *, started_at, duration, task, stack):
+        self.started_at = started_at
+        self.duration = duration
+        self.task = task
+        self.stack = stack
+
+    def format(self) -> str:
+        when = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started_at))
+        return f'[{when}] blocked for {self.duration * 1000:.0f}ms+ in {self.task}\n{self.stack}'
+
+
+class StallDetector:
+    """Detects callbacks that block the event loop, and captures what they were doing.
+
+    The loop bumps a heartbeat every ``interval`` seconds. A watchdog thread checks the heartbeat, and when it is more
+    than ``threshold`` seconds late, grabs the stack of the event loop thread -- which is, by definition, the code that
+    is blocking it. Stalls are kept in a ring buffer.
+    """
+
+    def __init__(self, *, loop, threshold: float = 0.1, interval: float = 0.05, keep: int = 50):
+        self.loop = loop
+        self.threshold = threshold
+        self.interval = interval
+        self.stalls = deque(maxlen=keep)
+
+        self._last_beat = time.monotonic()
+        self._beat_handle = None
+        self._loop_thread_id = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.loop.call_soon_threadsafe(self._start_beating)
+        self._thread = threading.Thread(target=self._watch, name='kmn-stall-detector', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._beat_handle is not None:
+            self._beat_handle.cancel()
+
+    def _start_beating(self):
+        self._loop_thread_id = threading.get_ident()
+        self._beat()
+
+    def _beat(self):
+        self._last_beat = time.monotonic()
+        self._beat_handle = self.loop.call_later(self.interval, self._beat)
+
+    def _capture(self):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = ''.join(traceback.format_stack(frame, limit=15)) if frame is not None else '<no stack>\n'
+
+        try:
+            task = asyncio.current_task(self.loop) if hasattr(asyncio, 'current_task') \
+                else asyncio.Task.current_task(self.loop)
+        except RuntimeError:
+            task = None
+
+        return stack, repr(task) if task is not None else '<no task>'
+
+    def _watch(self):
+        current = None
+
+        while not self._stopped.wait(self.interval):
+            if self._loop_thread_id is None:
+                continue
+
+            late = time.monotonic() - self._last_beat - self.interval
+
+            if late < self.threshold:
+                if current is not None:
+                    log.warning('event loop was blocked for %.0fms+ in %s', current.duration * 1000, current.task)
+                current = None
+                continue
+
+            if current is None:
+                stack, task = self._capture()
+                current = Stall(started_at=time.time() - late, duration=late, task=task, stack=stack)
+                self.stalls.append(current)
+            else:
+                current.duration = late
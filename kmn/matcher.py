@@ -0,0 +1,26 @@
+import re
+from typing import Iterable
+
+
+class PrefixMatcher:
+    """Decides whether a message could be a command with a single compiled regex over every prefix.
+
+    This only answers "does this start with a prefix?" -- the actual prefix resolution is still left to discord.py.
+    """
+
+    __slots__ = ('source', 'prefixes', '_match')
+
+    def __init__(self, prefixes: Iterable[str], *, source=None):
+        # what this matcher was built from, so callers can tell when it is out of date
+        self.source = source
+        self.prefixes = tuple(prefixes)
+
+        # longest alternatives go first, just like a trie would prefer them
+        alternatives = sorted(set(self.prefixes), key=len, reverse=True)
+        self._match = re.compile('|'.join(map(re.escape, alternatives))).match
+
+    def matches(self, content: str) -> bool:
+        return self._match(content) is not None
+
+    def __repr__(self):
+        return f'<PrefixMatcher prefixes={self.prefixes!r}>'
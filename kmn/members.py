@@ -0,0 +1,186 @@
+"""
+Keeping member and presence caching down to what the bot actually uses.
+
+discord.py caches every member it hears about, along with their presence (status and game), so memory grows with the
+amount of members in the guilds we're in. In slim mode, members are only cached while they're online (offline members
+aren't requested on startup, and are dropped when they go offline), and presences are trimmed down to the status.
+Members that aren't cached are fetched when they're needed, and kept around in a small LRU for a while.
+"""
+
+import asyncio
+import logging
+import sys
+from collections import deque
+from enum import Enum
+from types import FunctionType, MethodType, ModuleType
+
+from discord import ClientUser, Guild, Member, NotFound, User
+from discord.state import ConnectionState
+
+from kmn.cache import LRUCache
+
+log = logging.getLogger(__name__)
+
+
+def wrap_parser(state, event: str, *, before=None, after=None):
+    """Wraps a connection state's parser for a gateway event, calling ``before``/``after`` with the state and data."""
+    original = getattr(state, f'parse_{event}')
+
+    def parse(data):
+        if before is not None:
+            before(state, data)
+        original(data)
+        if after is not None:
+            after(state, data)
+
+    # depending on the version, events are dispatched through getattr or through this mapping
+    setattr(state, f'parse_{event}', parse)
+    parsers = getattr(state, 'parsers', None)
+    if isinstance(parsers, dict):
+        parsers[event.upper()] = parse
+
+
+class MemberCachePolicy:
+    """Decides which members (and how much of their presence) discord.py gets to cache."""
+
+    def __init__(self, *, slim: bool = False, fetched_size: int = 1000, fetched_ttl: float = 300):
+        self.slim = slim
+        self.fetched_size = fetched_size
+        self.fetched_ttl = fetched_ttl
+
+        # offline members dropped from the cache
+        self.evicted = 0
+
+    @property
+    def fetch_offline_members(self) -> bool:
+        return not self.slim
+
+    def install(self, state):
+        """Wraps the parsers of a connection state so that the policy is applied to incoming events."""
+        if not self.slim:
+            return
+
+        wrap_parser(state, 'guild_create', before=self._trim_guild)
+        wrap_parser(state, 'presence_update', before=self._trim_presence, after=self._evict_offline)
+        log.info('slim member caching enabled')
+
+    @staticmethod
+    def _strip(presence: dict):
+        # the status is all we look at
+        presence['game'] = None
+        presence.pop('activities', None)
+
+    def _trim_presence(self, state, data):
+        self._strip(data)
+
+    def _trim_guild(self, state, data):
+        presences = data.get('presences', [])
+        for presence in presences:
+            self._strip(presence)
+
+        # small guilds come with every member, online or not
+        if 'members' in data and state.user is not None:
+            keep = {presence['user']['id'] for presence in presences} | {str(state.user.id)}
+            data['members'] = [member for member in data['members'] if member['user']['id'] in keep]
+
+    def _evict_offline(self, state, data):
+        if data.get('status') != 'offline' or 'guild_id' not in data:
+            return
+
+        guild = state._get_guild(int(data['guild_id']))
+        if guild is None:
+            return
+
+        member = guild.get_member(int(data['user']['id']))
+        if member is not None and member != guild.me:
+            guild._remove_member(member)
+            self.evicted += 1
+
+
+class MemberFetcher:
+    """Gets members that might not be cached, fetching them over HTTP (and keeping them in an LRU) if they aren't."""
+
+    def __init__(self, bot, *, max_size: int = 1000, ttl: float = 300):
+        self.bot = bot
+        self.cache = LRUCache('members', max_size=max_size, ttl=ttl)
+        self.fetched = 0
+
+    async def get(self, guild, user_id: int):
+        member = guild.get_member(user_id)
+        if member is not None:
+            return member
+
+        key = (guild.id, user_id)
+        member = self.cache.get(key)
+        if member is not None:
+            return member
+
+        try:
+            data = await self.bot.http.get_member(guild.id, user_id)
+        except NotFound:
+            return None
+
+        # not part of the guild's cache, so it won't go stale there; it just expires
+        member = Member(data=data, guild=guild, state=self.bot._connection)
+        self.cache.put(key, member)
+        self.fetched += 1
+        return member
+
+
+# shared by everything, and referencing way more than the object that led to them
+SHARED = (type, ModuleType, FunctionType, MethodType, Enum, asyncio.AbstractEventLoop, ConnectionState)
+
+
+def _slots(cls) -> set:
+    slots = set()
+    for klass in cls.__mro__:
+        names = getattr(klass, '__slots__', ())
+        slots.update((names,) if isinstance(names, str) else names)
+    return slots
+
+
+async def footprint(root, *, stop=(), batch: int = 5000) -> int:
+    """Approximates the amount of bytes used by an object and everything it references.
+
+    Objects of the types in ``stop`` (other than the root itself) aren't counted or followed, which is how references to
+    shared objects (the connection state, other guilds, ...) are kept out of the count. Big guilds are a lot of
+    objects, so the loop gets a chance to run every ``batch`` of them.
+    """
+    stop = SHARED + tuple(stop)
+    seen, stack, size = set(), [root], 0
+
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or (obj is not root and isinstance(obj, stop)):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+
+        if len(seen) % batch == 0:
+            await asyncio.sleep(0)
+
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+            stack.extend(obj)
+
+        if hasattr(obj, '__dict__'):
+            stack.append(vars(obj))
+        for slot in _slots(type(obj)):
+            try:
+                stack.append(getattr(obj, slot))
+            except AttributeError:
+                pass
+
+    return size
+
+
+async def guild_footprints(bot):
+    """Yields ``(guild, bytes)`` for every guild. Users are shared between guilds, so they aren't counted here."""
+    for guild in list(bot.guilds):
+        yield guild, await footprint(guild, stop=(Guild, User, ClientUser))
+
+
+async def users_footprint(bot) -> int:
+    return await footprint(list(bot.users), stop=(Guild,))
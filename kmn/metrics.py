@@ -0,0 +1,132 @@
+import time
+from array import array
+
+# every power of two is split into this many linear sub-buckets (2 ** SUB_BUCKET_BITS), which bounds the relative
+# error of any reported value to 1 / 2 ** (SUB_BUCKET_BITS - 1), or ~6%
+SUB_BUCKET_BITS = 5
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+HALF_SUB_BUCKETS = SUB_BUCKETS >> 1
+
+
+def _bucket_for(value: int) -> int:
+    if value < SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    return SUB_BUCKETS + (shift - 1) * HALF_SUB_BUCKETS + (value >> shift) - HALF_SUB_BUCKETS
+
+
+def _bucket_bounds(index: int):
+    if index < SUB_BUCKETS:
+        return index, index
+    shift, offset = divmod(index - SUB_BUCKETS, HALF_SUB_BUCKETS)
+    shift += 1
+    mantissa = offset + HALF_SUB_BUCKETS
+    return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+
+class Histogram:
+    """A fixed-size, log-linear (HDR-style) latency histogram.
+
+    Values are recorded in seconds and stored as microseconds. All of the buckets are allocated up front, so recording
+    a value never allocates.
+    """
+
+    __slots__ = ('name', 'highest', 'counts', 'count', 'total', 'max')
+
+    def __init__(self, name: str, *, highest: float = 60.0):
+        self.name = name
+        self.highest = int(highest * 1_000_000)
+        self.counts = array('Q', bytes(8 * (_bucket_for(self.highest) + 1)))
+        self.reset()
+
+    def reset(self):
+        for index in range(len(self.counts)):
+            self.counts[index] = 0
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, seconds: float):
+        value = min(int(seconds * 1_000_000), self.highest)
+        self.counts[_bucket_for(value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, percentile: float) -> float:
+        """Returns the value at a percentile (0-100), in seconds."""
+        if not self.count:
+            return 0.0
+
+        target = max(1, round(self.count * percentile / 100))
+        seen = 0
+
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                low, high = _bucket_bounds(index)
+                return min((low + high) / 2, self.max) / 1_000_000
+
+        return self.max / 1_000_000
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count / 1_000_000 if self.count else 0.0
+
+    def record_bucket(self, index: int, count: int):
+        """Adds ``count`` values to a bucket directly, e.g. when rebuilding a histogram that was stored elsewhere."""
+        self.counts[index] += count
+        self.count += count
+        self.max = max(self.max, _bucket_bounds(index)[1])
+
+    def buckets(self):
+        """Yields ``(index, count)`` for every bucket that isn't empty."""
+        for index, count in enumerate(self.counts):
+            if count:
+                yield index, count
+
+    def merge(self, other: 'Histogram'):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def __repr__(self):
+        return f'<Histogram name={self.name!r} count={self.count}>'
+
+
+class _Timed:
+    __slots__ = ('histogram', 'started')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.histogram.record(time.perf_counter() - self.started)
+
+
+class Metrics:
+    """A registry of histograms."""
+
+    def __init__(self):
+        self.histograms = {}
+
+    def histogram(self, name: str) -> Histogram:
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram(name)
+        return histogram
+
+    def timed(self, name: str) -> _Timed:
+        """Returns a context manager that records how long its body took."""
+        return _Timed(self.histogram(name))
+
+    def reset(self):
+        for histogram in self.histograms.values():
+            histogram.reset()
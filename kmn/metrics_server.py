@@ -0,0 +1,175 @@
+import logging
+import math
+
+from aiohttp import web
+
+log = logging.getLogger(__name__)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _labels(**labels) -> str:
+    if not labels:
+        return ''
+    pairs = ','.join('{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                     for key, value in labels.items())
+    return '{' + pairs + '}'
+
+
+class _Exposition:
+    """Builds a page in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self.lines = []
+
+    def metric(self, name, kind, help_text):
+        self.lines.append(f'# HELP {name} {help_text}')
+        self.lines.append(f'# TYPE {name} {kind}')
+
+    def sample(self, name, value, **labels):
+        if value is None or (isinstance(value, float) and math.isnan(value)):
+            return
+        self.lines.append(f'{name}{_labels(**labels)} {value}')
+
+    def summary(self, name, histogram, **labels):
+        for quantile in QUANTILES:
+            self.sample(name, histogram.percentile(quantile * 100), quantile=quantile, **labels)
+        self.sample(f'{name}_sum', histogram.total / 1_000_000, **labels)
+        self.sample(f'{name}_count', histogram.count, **labels)
+
+    def render(self) -> str:
+        return '\n'.join(self.lines) + '\n'
+
+
+class MetricsServer:
+    """A small HTTP server exposing ``/metrics`` (Prometheus) and ``/health`` (JSON).
+
+    Everything here is read from memory, so scraping never touches Discord, Redis or Postgres.
+    """
+
+    def __init__(self, bot, *, host: str = '127.0.0.1', port: int = 9090):
+        self.bot = bot
+        self.host = host
+        self.port = port
+
+        self.app = web.Application(loop=bot.loop)
+        self.app.router.add_get('/metrics', self.metrics)
+        self.app.router.add_get('/health', self.health)
+
+        self._runner = None
+        self._server = None
+        self._handler = None
+
+    def _gateway_latency(self):
+        latency = getattr(self.bot, 'latency', None)
+        return None if latency is None or math.isnan(latency) or math.isinf(latency) else latency
+
+    async def metrics(self, request):
+        bot = self.bot
+        page = _Exposition()
+
+        page.metric('kmn_gateway_latency_seconds', 'gauge', 'Latency between a heartbeat and its acknowledgement.')
+        page.sample('kmn_gateway_latency_seconds', self._gateway_latency())
+
+        page.metric('kmn_guilds', 'gauge', 'Number of guilds.')
+        page.sample('kmn_guilds', len(bot.guilds))
+
+        page.metric('kmn_startup_seconds', 'gauge', 'Time taken by each stage of startup.')
+        for stage, seconds in bot.startup.stages.items():
+            page.sample('kmn_startup_seconds', seconds, stage=stage)
+
+        page.metric('kmn_loop_lag_seconds', 'gauge', 'Most recent event loop lag sample.')
+        page.sample('kmn_loop_lag_seconds', bot.lag_sampler.lag)
+
+        page.metric('kmn_redis_pool_connections', 'gauge', 'Redis pool connections.')
+        page.sample('kmn_redis_pool_connections', bot.redis.size, state='total')
+        page.sample('kmn_redis_pool_connections', bot.redis.freesize, state='free')
+
+        page.metric('kmn_postgres_pool_connections', 'gauge', 'Postgres pool connections.')
+        page.sample('kmn_postgres_pool_connections', bot.postgres.size, state='total')
+        page.sample('kmn_postgres_pool_connections', bot.postgres.free_size, state='free')
+
+        page.metric('kmn_cache_entries', 'gauge', 'Entries in an in-process cache.')
+        for cache in bot.caches:
+            page.sample('kmn_cache_entries', len(cache), cache=cache.name)
+
+        page.metric('kmn_cache_requests_total', 'counter', 'In-process cache lookups, by result.')
+        for cache in bot.caches:
+            page.sample('kmn_cache_requests_total', cache.hits, cache=cache.name, result='hit')
+            page.sample('kmn_cache_requests_total', cache.misses, cache=cache.name, result='miss')
+
+        page.metric('kmn_latency_seconds', 'summary', 'Latency of internal operations (hot path, pool checkouts).')
+        for name, histogram in sorted(bot.metrics.histograms.items()):
+            page.summary('kmn_latency_seconds', histogram, name=name)
+
+        command_stats = sorted(bot.command_stats.stats.values(), key=lambda stats: stats.name)
+
+        page.metric('kmn_command_latency_seconds', 'summary', 'Command invocation latency.')
+        for stats in command_stats:
+            page.summary('kmn_command_latency_seconds', stats.latency, command=stats.name)
+
+        page.metric('kmn_command_errors_total', 'counter', 'Command errors, by type.')
+        for stats in command_stats:
+            for error, count in stats.errors.items():
+                page.sample('kmn_command_errors_total', count, command=stats.name, error=error)
+
+        page.metric('kmn_command_active', 'gauge', 'Command invocations that are currently running.')
+        for stats in command_stats:
+            page.sample('kmn_command_active', stats.active, command=stats.name)
+
+        page.metric('kmn_scheduler_queue_depth', 'gauge', 'Commands waiting for a worker, by lane.')
+        for lane, queue in bot.scheduler.lanes.items():
+            page.sample('kmn_scheduler_queue_depth', queue.depth, lane=lane)
+
+        page.metric('kmn_breaker_open', 'gauge', 'Whether a backend circuit breaker is open.')
+        for breaker in bot.breakers:
+            page.sample('kmn_breaker_open', int(breaker.is_open), backend=breaker.name)
+
+        page.metric('kmn_breaker_rejected_total', 'counter', 'Calls refused by an open circuit breaker.')
+        for breaker in bot.breakers:
+            page.sample('kmn_breaker_rejected_total', breaker.rejected, backend=breaker.name)
+
+        page.metric('kmn_outgoing_queued', 'gauge', 'Messages waiting to be sent.')
+        page.sample('kmn_outgoing_queued', bot.outgoing.depth)
+
+        page.metric('kmn_shedding', 'gauge', 'Whether non-essential work is being shed.')
+        page.sample('kmn_shedding', int(bot.shedder.shedding))
+
+        return web.Response(text=page.render(), content_type='text/plain')
+
+    async def health(self, request):
+        bot = self.bot
+        return web.json_response({
+            'ready': bot.is_ready(),
+            'time_to_ready': bot.startup.time_to_ready,
+            'guilds': len(bot.guilds),
+            'shards': getattr(bot, 'shard_ids', None),
+            'gateway_latency': self._gateway_latency(),
+            'loop_lag': bot.lag_sampler.lag,
+            'redis': {'size': bot.redis.size, 'free': bot.redis.freesize},
+            'postgres': {'size': bot.postgres.size, 'free': bot.postgres.free_size},
+            'shedding': bot.shedder.shedding,
+            'breakers': {breaker.name: breaker.state for breaker in bot.breakers},
+            'scheduler': {lane: queue.depth for lane, queue in bot.scheduler.lanes.items()},
+            'commands': {stats.name: stats.latency.count for stats in bot.command_stats.stats.values()}
+        })
+
+    async def start(self):
+        if hasattr(web, 'AppRunner'):
+            self._runner = web.AppRunner(self.app)
+            await self._runner.setup()
+            await web.TCPSite(self._runner, self.host, self.port).start()
+        else:
+            self._handler = self.app.make_handler()
+            self._server = await self.bot.loop.create_server(self._handler, self.host, self.port)
+
+        log.info('serving metrics on http://%s:%d', self.host, self.port)
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+        elif self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            await self.app.shutdown()
+            await self._handler.shutdown(1.0)
+            await self.app.cleanup()
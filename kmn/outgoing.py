@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+# the most content a single message can have
+MESSAGE_LIMIT = 2000
+
+
+class _Pending:
+    __slots__ = ('content', 'kwargs', 'coalesce', 'future', 'queued_at')
+
+    def __init__(self, content, kwargs, coalesce, future):
+        self.content = content
+        self.kwargs = kwargs
+        self.coalesce = coalesce
+        self.future = future
+        self.queued_at = time.perf_counter()
+
+
+class _ChannelQueue:
+    """The messages waiting to be sent to a single channel, along with that channel's rate limit bucket."""
+
+    __slots__ = ('channel', 'pending', 'tokens', 'refilled_at', 'worker')
+
+    def __init__(self, channel, burst):
+        self.channel = channel
+        self.pending = deque()
+        self.tokens = burst
+        self.refilled_at = time.monotonic()
+        self.worker = None
+
+
+class OutgoingMessages:
+    """Sends messages through per-channel queues.
+
+    Sending a message is rate limited per channel by Discord (the ``POST /channels/{id}/messages`` route bucket), so
+    every channel gets its own queue, which is drained one message at a time and paced to stay within ``burst``
+    messages every ``per`` seconds instead of running into 429s. While a message waits, consecutive plain-text
+    messages that opted into coalescing are merged into it, up to the message length limit.
+
+    Coalesced messages share a single :class:`discord.Message`, so only opt into coalescing when the sent message
+    isn't edited or deleted afterwards.
+    """
+
+    def __init__(self, *, loop, metrics, window: float = 0.05, burst: int = 5, per: float = 5.0):
+        self.loop = loop
+        self.metrics = metrics
+        self.window = window
+        self.burst = burst
+        self.per = per
+
+        # channel id -> queue
+        self.queues = {}
+
+        # statistics
+        self.sent = 0
+        self.coalesced = 0
+
+    @property
+    def depth(self) -> int:
+        return sum(len(queue.pending) for queue in self.queues.values())
+
+    async def send(self, channel, content=None, *, coalesce: bool = False, **kwargs):
+        """Queues a message to be sent to a channel, and waits for it to be sent."""
+        queue = self.queues.get(channel.id)
+        if queue is None:
+            queue = self.queues[channel.id] = _ChannelQueue(channel, self.burst)
+
+        future = self.loop.create_future()
+        coalesce = coalesce and not kwargs and content is not None
+        queue.pending.append(_Pending(None if content is None else str(content), kwargs, coalesce, future))
+
+        if queue.worker is None:
+            queue.worker = self.loop.create_task(self._drain(queue))
+
+        return await future
+
+    async def _wait_for_token(self, queue):
+        rate = self.burst / self.per
+
+        while True:
+            now = time.monotonic()
+            queue.tokens = min(self.burst, queue.tokens + (now - queue.refilled_at) * rate)
+            queue.refilled_at = now
+
+            if queue.tokens >= 1:
+                queue.tokens -= 1
+                return
+
+            await asyncio.sleep((1 - queue.tokens) / rate)
+
+    def _take(self, queue):
+        """Takes the next message, merging coalescable messages that follow it."""
+        head = queue.pending.popleft()
+        batch = [head]
+
+        if not head.coalesce:
+            return head.content, head.kwargs, batch
+
+        content = head.content
+        while queue.pending and queue.pending[0].coalesce:
+            if queue.pending[0].future.cancelled():
+                queue.pending.popleft()
+                continue
+
+            merged = f'{content}\n{queue.pending[0].content}'
+            if len(merged) > MESSAGE_LIMIT:
+                break
+            content = merged
+            batch.append(queue.pending.popleft())
+
+        return content, {}, batch
+
+    async def _drain(self, queue):
+        try:
+            while queue.pending:
+                if queue.pending[0].future.cancelled():
+                    queue.pending.popleft()
+                    continue
+
+                await self._wait_for_token(queue)
+
+                # give plain text a moment to pile up
+                if queue.pending[0].coalesce and self.window:
+                    await asyncio.sleep(self.window)
+
+                content, kwargs, batch = self._take(queue)
+
+                started = time.perf_counter()
+                for pending in batch:
+                    self.metrics.histogram('outgoing.queue').record(started - pending.queued_at)
+
+                try:
+                    message = await queue.channel.send(content, **kwargs)
+                except Exception as error:
+                    for pending in batch:
+                        if not pending.future.done():
+                            pending.future.set_exception(error)
+                    continue
+
+                self.sent += 1
+                self.coalesced += len(batch) - 1
+
+                for pending in batch:
+                    if not pending.future.done():
+                        pending.future.set_result(message)
+        finally:
+            queue.worker = None
+            if not queue.pending:
+                self.queues.pop(queue.channel.id, None)
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+
+from discord import Message
+
+log = logging.getLogger(__name__)
+
+
+def stage(name: str = None):
+    """Marks a cog method as a message pipeline stage.
+
+    Stages are coroutines that receive a :class:`MessageState` for every message the bot sees. They are registered
+    and unregistered along with their cog.
+    """
+    def decorator(func):
+        func.__message_stage__ = name or func.__name__
+        return func
+    return decorator
+
+
+class MessageState:
+    """Per-message data that is shared between every pipeline stage, so that it's only computed once."""
+
+    __slots__ = ('bot', 'message', '_blocked')
+
+    def __init__(self, bot, message: Message):
+        self.bot = bot
+        self.message = message
+        self._blocked = None
+
+    @property
+    def author(self):
+        return self.message.author
+
+    @property
+    def guild(self):
+        return self.message.guild
+
+    def preflight(self):
+        """See :meth:`kmn.bot.Bot.preflight`."""
+        return self.bot.preflight(self.message)
+
+    async def is_blocked(self) -> bool:
+        if self._blocked is None:
+            self._blocked = await self.bot.is_blocked(self.author, preflight=await self.preflight())
+        return self._blocked
+
+    async def is_set(self, key: str) -> bool:
+        """Checks if a guild configuration key is set. Only keys that are gathered in the preflight are supported."""
+        if self.guild is None:
+            return False
+        return (await self.preflight()).is_set(key)
+
+
+class MessagePipeline:
+    """Runs every registered stage for each message, concurrently, and times them.
+
+    Stage latencies are recorded into the bot's metrics as ``stage.<name>``.
+    """
+
+    def __init__(self, bot, *, slow_threshold: float = 0.1):
+        self.bot = bot
+        self.slow_threshold = slow_threshold
+
+        # name -> coroutine function
+        self.stages = {}
+
+        # name -> count
+        self.slow = Counter()
+        self.failures = Counter()
+
+    def register(self, name: str, func):
+        if name in self.stages:
+            raise ValueError(f'message stage {name} is already registered')
+        self.stages[name] = func
+
+    def histogram(self, name: str):
+        return self.bot.metrics.histogram(f'stage.{name}')
+
+    def unregister(self, name: str):
+        self.stages.pop(name, None)
+
+    async def _run(self, name, func, state):
+        started = time.perf_counter()
+
+        try:
+            await func(state)
+        except Exception:
+            self.failures[name] += 1
+            log.exception('message stage %s failed', name)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.histogram(name).record(elapsed)
+
+            if elapsed > self.slow_threshold:
+                self.slow[name] += 1
+                log.warning('slow message stage %s: %.2fms (message %d)', name, elapsed * 1000, state.message.id)
+
+    async def process(self, message: Message):
+        state = MessageState(self.bot, message)
+        await asyncio.gather(*(self._run(name, func, state) for name, func in list(self.stages.items())))
@@ -0,0 +1,93 @@
+import asyncio
+
+import asyncpg
+
+
+def is_failure(error: Exception) -> bool:
+    """Checks if an error means Postgres itself is in trouble, as opposed to a query failing (or taking too long)."""
+    if isinstance(error, asyncio.TimeoutError):
+        return False
+    return isinstance(error, (OSError, asyncpg.InterfaceError, asyncpg.PostgresConnectionError))
+
+
+class _PoolAcquire:
+    __slots__ = ('postgres', 'timeout', 'conn')
+
+    def __init__(self, postgres, timeout):
+        self.postgres = postgres
+        self.timeout = timeout
+        self.conn = None
+
+    def __await__(self):
+        return self.postgres._acquire(self.timeout).__await__()
+
+    async def __aenter__(self):
+        self.conn = await self.postgres._acquire(self.timeout)
+        return self.conn
+
+    async def __aexit__(self, *args):
+        await self.postgres.release(self.conn)
+
+
+class Postgres:
+    """Wraps an asyncpg pool, timing connection checkouts and queries.
+
+    It mirrors the parts of :class:`asyncpg.pool.Pool` that we use; anything else is passed through. Checkouts and
+    queries go through a :class:`kmn.breaker.CircuitBreaker`. A checkout timing out counts against it, a query taking
+    long doesn't: queries have their own timeout (``query_timeout`` unless given), which is raised as usual.
+    """
+
+    def __init__(self, pool, *, metrics, tracer, breaker, query_timeout: float = 10.0):
+        self.pool = pool
+        self.metrics = metrics
+        self.tracer = tracer
+        self.breaker = breaker
+        self.query_timeout = query_timeout
+
+    @property
+    def size(self) -> int:
+        if hasattr(self.pool, 'get_size'):
+            return self.pool.get_size()
+        return len(getattr(self.pool, '_holders', []))
+
+    @property
+    def free_size(self) -> int:
+        if hasattr(self.pool, 'get_idle_size'):
+            return self.pool.get_idle_size()
+        queue = getattr(self.pool, '_queue', None)
+        return queue.qsize() if queue is not None else 0
+
+    async def _acquire(self, timeout):
+        with self.metrics.timed('postgres.acquire'), self.tracer.span('postgres acquire', 'postgres'):
+            return await self.breaker.call(self.pool.acquire, timeout=timeout)
+
+    def acquire(self, *, timeout=None):
+        return _PoolAcquire(self, timeout)
+
+    async def release(self, conn):
+        await self.pool.release(conn)
+
+    async def _query(self, method, query, *args, timeout=None, **kwargs):
+        timeout = self.query_timeout if timeout is None else timeout
+
+        async with self.acquire() as conn:
+            with self.metrics.timed('postgres.query'), self.tracer.span(f'postgres {method}', 'postgres', query=query):
+                return await self.breaker.track(getattr(conn, method), query, *args, timeout=timeout, **kwargs)
+
+    async def execute(self, query, *args, timeout=None):
+        return await self._query('execute', query, *args, timeout=timeout)
+
+    async def executemany(self, command, args, *, timeout=None):
+        return await self._query('executemany', command, args, timeout=timeout)
+
+    async def fetch(self, query, *args, timeout=None):
+        return await self._query('fetch', query, *args, timeout=timeout)
+
+    async def fetchval(self, query, *args, column=0, timeout=None):
+        return await self._query('fetchval', query, *args, column=column, timeout=timeout)
+
+    async def fetchrow(self, query, *args, timeout=None):
+        return await self._query('fetchrow', query, *args, timeout=timeout)
+
+    def __getattr__(self, name):
+        return getattr(self.pool, name)
@@ -0,0 +1,66 @@
+from kmn.guild_config import GUILD_KEY, is_enabled
+from kmn.redis import Script
+
+# guild configuration keys that are needed for every message
+PREFLIGHT_CONFIG_KEYS = ('message_logging',)
+
+# KEYS: blocked key, prefixes key, guild configuration keys...
+# ARGV: default prefixes, seeded if the guild has no prefixes yet
+PREFLIGHT_SCRIPT = Script("""
+local blocked = redis.call('GET', KEYS[1])
+
+local prefixes = redis.call('SMEMBERS', KEYS[2])
+if #prefixes == 0 then
+  redis.call('SADD', KEYS[2], unpack(ARGV))
+  prefixes = ARGV
+end
+
+local result = {blocked, prefixes}
+for index = 3, #KEYS do
+  result[index] = redis.call('GET', KEYS[index])
+end
+
+return result
+""")
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class Preflight:
+    """Per-message facts that the bot and cogs need, gathered in at most one round trip.
+
+    ``blocked`` is ``None`` when the author's blocked status wasn't cached anywhere; ``fetched`` is ``True`` if Redis
+    was already asked about it (so there's no point in asking again).
+    """
+
+    __slots__ = ('blocked', 'prefixes', 'config', 'fetched')
+
+    def __init__(self, *, blocked, prefixes, config, fetched=False):
+        self.blocked = blocked
+        self.prefixes = prefixes
+        self.config = config
+        self.fetched = fetched
+
+    def is_set(self, key: str) -> bool:
+        """Mirrors :meth:`kmn.guild_config.GuildConfig.is_set`."""
+        return is_enabled(self.config.get(key))
+
+    @classmethod
+    async def run(cls, conn, *, guild, blocked_key, prefixes_key, default_prefixes):
+        """Runs the preflight script for a guild message."""
+        keys = [blocked_key, prefixes_key] + [GUILD_KEY.format(guild, key) for key in PREFLIGHT_CONFIG_KEYS]
+        blocked, prefixes, *config = await PREFLIGHT_SCRIPT(conn, keys=keys, args=default_prefixes)
+
+        blocked = _decode(blocked)
+
+        return cls(
+            blocked=None if blocked is None else blocked == 'yes',
+            prefixes=[_decode(prefix) for prefix in prefixes],
+            config={key: _decode(value) for key, value in zip(PREFLIGHT_CONFIG_KEYS, config)},
+            fetched=True
+        )
+
+    def __repr__(self):
+        return f'<Preflight blocked={self.blocked} prefixes={self.prefixes!r} config={self.config!r}>'
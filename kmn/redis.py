@@ -0,0 +1,277 @@
+import asyncio
+import hashlib
+import time
+from collections import Counter
+
+from aioredis import Redis, RedisError, ReplyError
+
+
+class Script:
+    """A server-side Lua script.
+
+    Scripts are run with ``EVALSHA``, falling back to ``EVAL`` (which also caches the script in Redis) when Redis
+    doesn't know about the script yet, e.g. after a restart or a ``SCRIPT FLUSH``.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.sha = hashlib.sha1(source.encode()).hexdigest()
+
+    async def __call__(self, conn, *, keys=(), args=()):
+        keys, args = list(keys), list(args)
+
+        try:
+            return await conn.evalsha(self.sha, keys=keys, args=args)
+        except ReplyError as error:
+            if not str(error).startswith('NOSCRIPT'):
+                raise
+
+        return await conn.eval(self.source, keys=keys, args=args)
+
+
+# commands that can safely share a single in-flight result
+READ_COMMANDS = frozenset({
+    'get', 'mget', 'exists', 'ttl', 'pttl', 'strlen', 'smembers', 'sismember', 'scard', 'hget', 'hmget', 'hgetall',
+    'hexists', 'hlen', 'llen', 'lrange', 'lindex', 'zscore', 'zcard', 'zrange', 'zrevrange'
+})
+
+# commands that change the state of a connection, so they need one to themselves (see :meth:`PipelinedRedis.acquire`)
+DEDICATED_COMMANDS = frozenset({
+    'subscribe', 'unsubscribe', 'psubscribe', 'punsubscribe', 'multi_exec', 'pipeline', 'select', 'watch', 'unwatch',
+    'blpop', 'brpop', 'brpoplpush', 'monitor', 'quit', 'close', 'wait_closed'
+})
+
+
+def is_failure(error: Exception) -> bool:
+    """Checks if an error means Redis itself is in trouble, as opposed to it replying with an error."""
+    return isinstance(error, (OSError, RedisError)) and not isinstance(error, ReplyError)
+
+
+class PipelineStats:
+    """Statistics about a :class:`PipelinedRedis`."""
+
+    __slots__ = ('batches', 'commands', 'largest_batch', 'batch_sizes', 'coalesced_reads', 'queue_wait',
+                 'longest_queue_wait')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.batches = 0
+        self.commands = 0
+        self.largest_batch = 0
+        # power of two -> number of batches with a size up to it
+        self.batch_sizes = Counter()
+        self.coalesced_reads = 0
+        # seconds spent between a command being issued and it being written
+        self.queue_wait = 0.0
+        self.longest_queue_wait = 0.0
+
+    def record_batch(self, size: int):
+        self.batches += 1
+        self.commands += size
+        self.largest_batch = max(self.largest_batch, size)
+        self.batch_sizes[1 << (size - 1).bit_length()] += 1
+
+    def record_wait(self, wait: float):
+        self.queue_wait += wait
+        self.longest_queue_wait = max(self.longest_queue_wait, wait)
+
+    @property
+    def average_batch(self) -> float:
+        return self.commands / self.batches if self.batches else 0.0
+
+    @property
+    def average_queue_wait(self) -> float:
+        return self.queue_wait / self.commands if self.commands else 0.0
+
+
+class _Checkout:
+    """Lets ``with await redis as conn:`` keep working on a :class:`PipelinedRedis`."""
+
+    __slots__ = ('redis',)
+
+    def __init__(self, redis):
+        self.redis = redis
+
+    def __enter__(self):
+        return self.redis
+
+    def __exit__(self, *args):
+        pass
+
+
+class PipelinedRedis:
+    """Wraps an aioredis pool, automatically pipelining commands.
+
+    Every command issued in the same event-loop tick is sent down a single pooled connection as one pipeline, and
+    identical reads that are already in flight share their result instead of being sent again. Commands are called
+    just like they are on an aioredis connection::
+
+        value = await bot.redis.get('key')
+
+        # still works, but doesn't hold a connection anymore
+        with await bot.redis as conn:
+            value = await conn.get('key')
+
+    Anything that needs a connection to itself (pub/sub, transactions, blocking pops) has to use :meth:`acquire`.
+
+    If a :class:`kmn.breaker.CircuitBreaker` is given, every command goes through it.
+    """
+
+    def __init__(self, pool, *, loop, metrics=None, tracer=None, breaker=None):
+        self.pool = pool
+        self.loop = loop
+        self.metrics = metrics
+        self.tracer = tracer
+        self.breaker = breaker
+        self.stats = PipelineStats()
+
+        # (command, args, kwargs, future, issued at)
+        self._queue = []
+        self._scheduled = False
+
+        # (command, args, kwargs) -> future
+        self._in_flight = {}
+
+    def __await__(self):
+        return self._checkout().__await__()
+
+    async def _checkout(self):
+        return _Checkout(self)
+
+    def acquire(self):
+        """Acquires a dedicated connection from the underlying pool. It must be released with :meth:`release`."""
+        return self.pool.acquire()
+
+    def release(self, conn):
+        self.pool.release(conn)
+
+    @property
+    def size(self):
+        return self.pool.size
+
+    @property
+    def freesize(self):
+        return self.pool.freesize
+
+    def __getattr__(self, name):
+        if name.startswith('_') or not hasattr(Redis, name):
+            raise AttributeError(name)
+
+        if name in DEDICATED_COMMANDS:
+            raise AttributeError(f'{name} needs a dedicated connection, use acquire()')
+
+        def command(*args, **kwargs):
+            return self._issue(name, args, kwargs)
+
+        return command
+
+    def _issue(self, name, args, kwargs):
+        if self.breaker is not None:
+            result = self.breaker.call(self._enqueue, name, args, kwargs)
+        else:
+            result = self._enqueue(name, args, kwargs)
+
+        if self.tracer is not None and self.tracer.active():
+            return self.tracer.wrap(result, f'redis {name}', 'redis')
+
+        return result
+
+    def _enqueue(self, name, args, kwargs):
+        key = None
+
+        if name in READ_COMMANDS:
+            try:
+                key = (name, args, tuple(sorted(kwargs.items())))
+                future = self._in_flight.get(key)
+            except TypeError:
+                # unhashable arguments, just don't share
+                key = future = None
+
+            if future is not None:
+                self.stats.coalesced_reads += 1
+                return asyncio.shield(future)
+        elif self._in_flight:
+            self._forget_reads(args)
+
+        future = self.loop.create_future()
+        self._queue.append((name, args, kwargs, future, time.perf_counter()))
+
+        if key is not None:
+            self._in_flight[key] = future
+            future.add_done_callback(lambda _: self._in_flight.get(key) is future and self._in_flight.pop(key))
+
+        if not self._scheduled:
+            self._scheduled = True
+            self.loop.call_soon(self._flush)
+
+        # shielded so that a cancelled caller can't cancel a result that others are waiting on
+        return asyncio.shield(future) if key is not None else future
+
+    def _forget_reads(self, args):
+        """Stops sharing in-flight reads of the keys a write touches.
+
+        Those reads may run before the write, so anyone reading after it has to get a result of their own.
+        """
+        touched = {arg for arg in args if isinstance(arg, (str, bytes))}
+        for key in [key for key in self._in_flight if touched.intersection(key[1])]:
+            del self._in_flight[key]
+
+    def _flush(self):
+        self._scheduled = False
+        batch, self._queue = self._queue, []
+        self.loop.create_task(self._execute(batch))
+
+    async def _execute(self, batch):
+        batch = [entry for entry in batch if not entry[3].cancelled()]
+
+        if not batch:
+            return
+
+        queued = []
+        try:
+            acquiring = time.perf_counter()
+            with await self.pool as conn:
+                now = time.perf_counter()
+                if self.metrics is not None:
+                    self.metrics.histogram('redis.acquire').record(now - acquiring)
+
+                pipe = conn.pipeline()
+                for entry in batch:
+                    name, args, kwargs, future, _ = entry
+                    # bad arguments are only that caller's problem, not the whole batch's
+                    try:
+                        queued.append((entry, getattr(pipe, name)(*args, **kwargs)))
+                    except Exception as error:
+                        if not future.done():
+                            future.set_exception(error)
+
+                if not queued:
+                    return
+
+                await pipe.execute(return_exceptions=True)
+        except Exception as error:
+            for *_, future, _ in batch:
+                if not future.done():
+                    future.set_exception(error)
+            # nobody else will look at these, so asyncio would complain about them
+            for _, result in queued:
+                if result.done() and not result.cancelled():
+                    result.exception()
+            return
+
+        self.stats.record_batch(len(queued))
+
+        for (*_, future, issued_at), result in queued:
+            self.stats.record_wait(now - issued_at)
+
+            if future.done():
+                continue
+
+            if result.cancelled():
+                future.cancel()
+            elif result.exception() is not None:
+                future.set_exception(result.exception())
+            else:
+                future.set_result(result.result())
@@ -0,0 +1,319 @@
+import ast
+import asyncio
+import hashlib
+import importlib
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+
+def _is_within(module: str, name: str) -> bool:
+    return module == name or module.startswith(name + '.')
+
+
+def _source_files(module) -> list:
+    # a package is just its __init__.py, its submodules are tracked by themselves
+    path = getattr(module, '__file__', None)
+    return [] if path is None else [Path(path)]
+
+
+def _imports(module) -> set:
+    """Finds the ``kmn`` modules that a module imports, by parsing its source."""
+    found = set()
+
+    for path in _source_files(module):
+        try:
+            tree = ast.parse(path.read_bytes(), str(path))
+        except (OSError, SyntaxError):
+            continue
+
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                found.update(alias.name for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                found.add(node.module)
+
+    return {name for name in found if _is_within(name, 'kmn')}
+
+
+class ModuleState:
+    __slots__ = ('mtime', 'digest')
+
+    def __init__(self, mtime, digest):
+        self.mtime = mtime
+        self.digest = digest
+
+
+class ReloadResult:
+    __slots__ = ('module', 'duration', 'error', 'rolled_back')
+
+    def __init__(self, module, duration, error=None, rolled_back=False):
+        self.module = module
+        self.duration = duration
+        self.error = error
+        self.rolled_back = rolled_back
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class Reloader:
+    """Reloads only the extensions (and the helper modules they use) whose source changed.
+
+    Modules are checked by modification time first, and by a hash of their source when that changed. A changed module
+    is reloaded along with every extension that (indirectly) imports it. Failed reloads are rolled back to the module
+    that was loaded before. Cogs hand their state over to their replacements (see :meth:`kmn.cog.Cog.hand_over`).
+
+    ``kmn.bot`` and everything it imports make up the running bot itself, so those can't be swapped out from under it;
+    changes to them are reported as needing a restart instead.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.states = {}
+
+        # module name -> (state, the kmn modules it imports), so that only changed modules are parsed again
+        self._parsed = {}
+
+    @staticmethod
+    def _modules():
+        return {name: module for name, module in list(sys.modules.items())
+                if module is not None and _is_within(name, 'kmn') and getattr(module, '__file__', None)}
+
+    def _state(self, module, previous=None):
+        files = _source_files(module)
+        mtime = max((os.stat(path).st_mtime for path in files), default=0)
+
+        # nothing was touched, don't bother hashing
+        if previous is not None and previous.mtime == mtime:
+            return previous
+
+        digest = hashlib.sha1()
+        for path in files:
+            digest.update(path.read_bytes())
+        return ModuleState(mtime, digest.hexdigest())
+
+    def remember(self, names=None):
+        """Records the current state of some (by default, all) modules as the baseline."""
+        modules = self._modules()
+        for name in names if names is not None else modules:
+            if name in modules:
+                self.states[name] = self._state(modules[name])
+
+    def changed(self) -> set:
+        changed = set()
+
+        for name, module in self._modules().items():
+            previous = self.states.get(name)
+            try:
+                state = self._state(module, previous)
+            except OSError:
+                continue
+
+            if previous is None:
+                # first time we see it (e.g. a lazily loaded cog), that's the baseline
+                self.states[name] = state
+            elif state.digest != previous.digest:
+                changed.add(name)
+            else:
+                # same content, just touched
+                self.states[name] = state
+
+        return changed
+
+    def _imports_of(self, name, module) -> set:
+        parsed = self._parsed.get(name)
+
+        try:
+            state = self._state(module, parsed[0] if parsed is not None else None)
+        except OSError:
+            return set()
+
+        if parsed is None or parsed[0].digest != state.digest:
+            parsed = (state, _imports(module))
+        self._parsed[name] = (state, parsed[1])
+        return parsed[1]
+
+    def plan(self, *, everything: bool = False):
+        """Works out what to reload. Returns ``(helpers, extensions, pinned)``, helpers in dependency order."""
+        extensions = set(self.bot.extensions)
+        changed = set(extensions) if everything else self.changed()
+
+        # the common case when watching, don't bother with the import graph
+        if not changed:
+            return [], [], []
+
+        modules = self._modules()
+        graph = {name: self._imports_of(name, module) for name, module in modules.items()}
+
+        def closure(root):
+            seen, stack = set(), [root]
+            while stack:
+                for dependency in graph.get(stack.pop(), ()):
+                    if dependency not in seen:
+                        seen.add(dependency)
+                        stack.append(dependency)
+            return seen
+
+        core = closure('kmn.bot') | {'kmn', 'kmn.bot', __name__}
+
+        pinned = sorted(name for name in changed if name in core and name not in extensions)
+        helpers = {name for name in changed if name not in core and name not in extensions}
+        dirty = helpers | (changed & extensions)
+
+        affected = sorted(name for name in extensions if name in dirty or closure(name) & dirty)
+
+        # dependencies before dependents
+        ordered, visiting = [], set()
+
+        def visit(name):
+            if name in visiting or name in ordered:
+                return
+            visiting.add(name)
+            for dependency in graph.get(name, ()):
+                if dependency in helpers:
+                    visit(dependency)
+            ordered.append(name)
+
+        for name in sorted(helpers):
+            visit(name)
+
+        return ordered, affected, pinned
+
+    def _reload_helper(self, name) -> ReloadResult:
+        module = sys.modules[name]
+        backup = dict(module.__dict__)
+        started = time.perf_counter()
+
+        try:
+            importlib.reload(module)
+        except Exception as error:
+            log.exception('failed to reload %s, rolling back', name)
+            module.__dict__.clear()
+            module.__dict__.update(backup)
+            return ReloadResult(name, time.perf_counter() - started, error, rolled_back=True)
+
+        return ReloadResult(name, time.perf_counter() - started)
+
+    def _purge(self, name):
+        """Removes whatever a half-loaded extension managed to add."""
+        bot = self.bot
+
+        for cog_name, cog in list(bot.cogs.items()):
+            if _is_within(type(cog).__module__, name):
+                bot.remove_cog(cog_name)
+
+        for command in list(bot.all_commands.values()):
+            if _is_within(getattr(command.callback, '__module__', ''), name):
+                bot.remove_command(command.name)
+
+    def _hand_over(self, name) -> dict:
+        handoffs = {}
+
+        for cog_name, cog in self.bot.cogs.items():
+            if not _is_within(type(cog).__module__, name) or not hasattr(cog, 'hand_over'):
+                continue
+            try:
+                handoffs[cog_name] = cog.hand_over()
+            except Exception:
+                log.exception('failed to export state from %s, it will start fresh', cog_name)
+
+        return handoffs
+
+    def _take_over(self, handoffs: dict):
+        for cog_name, (state, tasks) in handoffs.items():
+            cog = self.bot.get_cog(cog_name)
+
+            try:
+                if cog is None:
+                    raise LookupError(f'{cog_name} is gone')
+                cog.take_over(state, tasks)
+            except Exception:
+                log.exception('failed to hand state over to %s', cog_name)
+
+                # nobody is going to look after these
+                for task in tasks:
+                    task.cancel()
+
+    def _reload_extension(self, name) -> ReloadResult:
+        bot = self.bot
+        old = sys.modules.get(name)
+        started = time.perf_counter()
+
+        # taken before unloading, handed to whichever instances end up loaded
+        handoffs = self._hand_over(name)
+
+        try:
+            bot.unload_extension(name)
+            bot.load_extension(name)
+        except Exception as error:
+            log.exception('failed to reload %s, rolling back', name)
+
+            bot.extensions.pop(name, None)
+            self._purge(name)
+
+            rolled_back = False
+            if old is not None:
+                try:
+                    sys.modules[name] = old
+                    old.setup(bot)
+                    bot.extensions[name] = old
+                    rolled_back = True
+                except Exception:
+                    log.exception('failed to roll %s back', name)
+                    self._purge(name)
+
+            self._take_over(handoffs)
+            return ReloadResult(name, time.perf_counter() - started, error, rolled_back)
+
+        self._take_over(handoffs)
+        return ReloadResult(name, time.perf_counter() - started)
+
+    def reload(self, *, everything: bool = False):
+        """Reloads what changed. Returns ``(results, pinned)``."""
+        helpers, extensions, pinned = self.plan(everything=everything)
+        results = []
+
+        for name in helpers:
+            result = self._reload_helper(name)
+            results.append(result)
+            if not result.ok:
+                # don't reload dependents against a helper that was rolled back halfway through the plan
+                return results, pinned
+
+        for name in extensions:
+            results.append(self._reload_extension(name))
+
+        # what we just loaded is the new baseline. failures stay dirty, so they're retried next time.
+        self.remember([result.module for result in results if result.ok])
+
+        return results, pinned
+
+    async def watch(self, *, interval: float = 1.0):
+        """Reloads changed modules as soon as they are saved. Meant for testing."""
+        log.info('watching for changes')
+
+        while True:
+            await asyncio.sleep(interval)
+
+            results, pinned = self.reload()
+            if not results and not pinned:
+                continue
+
+            for result in results:
+                if result.ok:
+                    log.info('reloaded %s in %.2fms', result.module, result.duration * 1000)
+                else:
+                    log.warning('failed to reload %s: %s', result.module, result.error)
+
+            if pinned:
+                log.warning('restart to pick up changes to %s', ', '.join(pinned))
+                # don't nag about the same thing every second
+                self.remember(pinned)
+
+            self.bot.responses.clear()
@@ -0,0 +1,91 @@
+import functools
+
+from kmn.cache import LRUCache
+
+
+def permission_key(ctx):
+    """Sums up what decides which commands someone can see, for responses that depend on it."""
+    admin = ctx.author.id in ctx.bot.config.get('admins', [])
+    permissions = ctx.channel.permissions_for(ctx.author).value if ctx.guild else None
+    return admin, permissions
+
+
+class ResponseCache:
+    """Caches what read-only commands send, keyed by command, arguments and guild.
+
+    Entries carry tags, so that everything depending on something (like a guild's prefixes) can be dropped when it
+    changes.
+    """
+
+    def __init__(self, *, max_size: int = 1000, ttl: float = 60):
+        # key -> (tags, response)
+        self.cache = LRUCache('responses', max_size=max_size, ttl=ttl)
+
+    @staticmethod
+    def key(name: str, ctx, args=(), *, per_guild: bool = True, vary=None):
+        guild = ctx.guild.id if per_guild and ctx.guild else None
+        return name, guild, args, vary
+
+    def get(self, key):
+        entry = self.cache.get(key)
+        return None if entry is None else entry[1]
+
+    def put(self, key, response, *, tags=()):
+        self.cache.put(key, (frozenset(tags), response))
+
+    def invalidate(self, tag: str, *, guild: int = None):
+        """Drops every response with a tag, optionally only for a single guild."""
+        def matches(key, entry):
+            return tag in entry[0] and (guild is None or key[1] == guild)
+
+        self.cache.invalidate_where(matches)
+
+    def clear(self):
+        self.cache.clear()
+
+
+def cached_response(*tags, per_guild: bool = True, vary=None):
+    """Caches the messages a command sends, and replays them on later invocations with the same arguments.
+
+    Only use this on commands that don't change anything, and whose output only depends on their arguments, the
+    guild (unless ``per_guild`` is ``False``) and ``vary(ctx)``. Responses with files are never cached.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(self, ctx, *args, **kwargs):
+            cache = ctx.bot.responses
+
+            try:
+                key = cache.key(
+                    ctx.command.qualified_name, ctx, (args, tuple(sorted(kwargs.items()))),
+                    per_guild=per_guild, vary=vary(ctx) if vary else None
+                )
+                sends = cache.get(key)
+            except TypeError:
+                # unhashable arguments
+                return await func(self, ctx, *args, **kwargs)
+
+            if sends is not None:
+                for send_args, send_kwargs in sends:
+                    await ctx.send(*send_args, **send_kwargs)
+                return
+
+            sends = []
+            send = ctx.send
+
+            async def recording_send(*send_args, **send_kwargs):
+                sends.append((send_args, send_kwargs))
+                return await send(*send_args, **send_kwargs)
+
+            ctx.send = recording_send
+            try:
+                result = await func(self, ctx, *args, **kwargs)
+            finally:
+                del ctx.send
+
+            if sends and not any('file' in send_kwargs or 'files' in send_kwargs for _, send_kwargs in sends):
+                cache.put(key, sends, tags=tags)
+
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import time
+from collections import Counter, deque
+
+log = logging.getLogger(__name__)
+
+PRIORITY = 'priority'
+NORMAL = 'normal'
+
+
+class _Job:
+    __slots__ = ('ctx', 'command', 'guild', 'future', 'queued_at')
+
+    def __init__(self, ctx, command, guild, future):
+        self.ctx = ctx
+        self.command = command
+        self.guild = guild
+        self.future = future
+        self.queued_at = time.perf_counter()
+
+
+class _Lane:
+    """A queue that is fair across guilds: guilds take turns, one job at a time."""
+
+    def __init__(self):
+        # guild id (None for dms) -> deque of jobs
+        self.queues = {}
+        # guilds with queued jobs, in turn order
+        self.turns = deque()
+        self.depth = 0
+
+    def push(self, job):
+        queue = self.queues.get(job.guild)
+        if queue is None:
+            queue = self.queues[job.guild] = deque()
+            self.turns.append(job.guild)
+        queue.append(job)
+        self.depth += 1
+
+    def take(self, can_run):
+        """Takes the next job whose command can run, giving each guild one turn."""
+        for _ in range(len(self.turns)):
+            guild = self.turns[0]
+            queue = self.queues[guild]
+
+            if not can_run(queue[0].command):
+                # this guild's next command is at its cap, let the next guild go
+                self.turns.rotate(-1)
+                continue
+
+            job = queue.popleft()
+            self.depth -= 1
+            self.turns.popleft()
+
+            if queue:
+                # back of the line
+                self.turns.append(guild)
+            else:
+                del self.queues[guild]
+
+            return job
+
+        return None
+
+
+class CommandScheduler:
+    """Runs commands on a bounded pool of workers.
+
+    Admin commands (see :func:`kmn.checks.has_priority`) go into a priority lane with its own workers, so they never
+    wait behind everybody else. Within a lane, guilds take turns so one busy guild can't starve the rest, and commands
+    can be capped to a number of concurrent invocations.
+    """
+
+    def __init__(self, run, *, metrics, workers: int = 16, priority_workers: int = 2, command_limits: dict = None):
+        self._run = run
+        self.metrics = metrics
+        self.workers = workers
+        self.priority_workers = priority_workers
+        self.command_limits = command_limits or {}
+
+        self.lanes = {PRIORITY: _Lane(), NORMAL: _Lane()}
+        self.running = Counter()
+        self.peak_depth = 0
+        self._condition = asyncio.Condition()
+
+    @property
+    def depth(self) -> int:
+        return sum(lane.depth for lane in self.lanes.values())
+
+    def _can_run(self, command: str) -> bool:
+        limit = self.command_limits.get(command)
+        return limit is None or self.running[command] < limit
+
+    def _take(self, lanes):
+        for lane in lanes:
+            job = self.lanes[lane].take(self._can_run)
+            if job is not None:
+                return job
+        return None
+
+    async def submit(self, ctx, *, priority: bool = False):
+        """Queues a command invocation, and waits for it to finish."""
+        future = asyncio.get_event_loop().create_future()
+        job = _Job(ctx, ctx.command.qualified_name, ctx.guild.id if ctx.guild else None, future)
+
+        async with self._condition:
+            self.lanes[PRIORITY if priority else NORMAL].push(job)
+            self.peak_depth = max(self.peak_depth, self.depth)
+            self._condition.notify_all()
+
+        await asyncio.shield(future)
+
+    async def _execute(self, job):
+        self.running[job.command] += 1
+        self.metrics.histogram('scheduler.wait').record(time.perf_counter() - job.queued_at)
+
+        try:
+            await self._run(job.ctx)
+        except Exception:
+            log.exception('failed to run command %s', job.command)
+        finally:
+            self.running[job.command] -= 1
+            if not self.running[job.command]:
+                del self.running[job.command]
+
+            if not job.future.done():
+                job.future.set_result(None)
+
+            # a command cap might have opened up
+            async with self._condition:
+                self._condition.notify_all()
+
+    async def _worker(self, lanes):
+        while True:
+            async with self._condition:
+                job = self._take(lanes)
+                while job is None:
+                    await self._condition.wait()
+                    job = self._take(lanes)
+
+            await self._execute(job)
+
+    async def run(self):
+        """Runs every worker forever."""
+        workers = [self._worker((PRIORITY,)) for _ in range(self.priority_workers)]
+        workers += [self._worker((PRIORITY, NORMAL)) for _ in range(self.workers)]
+        await asyncio.gather(*workers)
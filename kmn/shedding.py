@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import time
+from collections import Counter, deque
+
+log = logging.getLogger(__name__)
+
+
+class Episode:
+    """A period of time where the bot was overloaded and shedding work."""
+
+    __slots__ = ('started_at', 'ended_at', 'reason', 'peak_lag', 'peak_depth', 'dropped', 'deferred')
+
+    def __init__(self, reason: str):
+        self.started_at = time.time()
+        self.ended_at = None
+        self.reason = reason
+        self.peak_lag = 0.0
+        self.peak_depth = 0
+
+        # kind of work -> amount
+        self.dropped = Counter()
+        self.deferred = Counter()
+
+    @property
+    def duration(self) -> float:
+        return (self.ended_at or time.time()) - self.started_at
+
+    def format(self) -> str:
+        when = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started_at))
+        dropped = ', '.join(f'{kind}: {amount}' for kind, amount in self.dropped.most_common()) or 'nothing'
+        deferred = ', '.join(f'{kind}: {amount}' for kind, amount in self.deferred.most_common()) or 'nothing'
+        state = '' if self.ended_at else ' (ongoing)'
+        return (
+            f'[{when}] {self.duration:.1f}s{state}, {self.reason}, peak lag {self.peak_lag * 1000:.0f}ms, '
+            f'peak queue {self.peak_depth}\n  dropped: {dropped}\n  deferred: {deferred}'
+        )
+
+
+class LoadShedder:
+    """Decides when the bot is overloaded, so that non-essential work can be shed.
+
+    The bot is overloaded when event loop lag or the command queue depth crosses a threshold, and recovers once
+    both have stayed under their thresholds for ``recover_after`` seconds. Consumers check :attr:`shedding` and
+    report what they dropped or deferred through :meth:`drop` and :meth:`defer`. Recovery handlers are called once an
+    episode is over, so deferred work can be caught up on.
+    """
+
+    def __init__(self, *, lag_sampler, scheduler, lag_threshold_ms: float = 250, depth_threshold: int = 100,
+                 recover_after: float = 5.0, interval: float = 0.5, keep: int = 20):
+        self.lag_sampler = lag_sampler
+        self.scheduler = scheduler
+        self.lag_threshold = lag_threshold_ms / 1000
+        self.depth_threshold = depth_threshold
+        self.recover_after = recover_after
+        self.interval = interval
+
+        self.episode = None
+        self.episodes = deque(maxlen=keep)
+        self.handlers = {}
+        self._calm_since = None
+
+    @property
+    def shedding(self) -> bool:
+        return self.episode is not None
+
+    def register(self, name: str, handler):
+        """Registers a coroutine function that is called when an episode ends."""
+        self.handlers[name] = handler
+
+    def unregister(self, name: str):
+        self.handlers.pop(name, None)
+
+    def drop(self, kind: str, amount: int = 1):
+        if self.episode is not None:
+            self.episode.dropped[kind] += amount
+
+    def defer(self, kind: str, amount: int = 1):
+        if self.episode is not None:
+            self.episode.deferred[kind] += amount
+
+    def _pressure(self, lag: float, depth: int):
+        if lag >= self.lag_threshold:
+            return f'loop lag {lag * 1000:.0f}ms'
+        if depth >= self.depth_threshold:
+            return f'{depth} queued commands'
+        return None
+
+    def check(self):
+        lag, depth = self.lag_sampler.lag, self.scheduler.depth
+        reason = self._pressure(lag, depth)
+
+        if self.episode is None:
+            if reason is None:
+                return
+            self.episode = Episode(reason)
+            self.episodes.append(self.episode)
+            log.warning('overloaded (%s), shedding non-essential work', reason)
+
+        self.episode.peak_lag = max(self.episode.peak_lag, lag)
+        self.episode.peak_depth = max(self.episode.peak_depth, depth)
+
+        if reason is not None:
+            self._calm_since = None
+            return
+
+        now = time.monotonic()
+        if self._calm_since is None:
+            self._calm_since = now
+        if now - self._calm_since < self.recover_after:
+            return
+
+        self._recover()
+
+    def _recover(self):
+        episode, self.episode, self._calm_since = self.episode, None, None
+        episode.ended_at = time.time()
+        log.warning('recovered after %.1fs of shedding (dropped %d, deferred %d)', episode.duration,
+                    sum(episode.dropped.values()), sum(episode.deferred.values()))
+
+        for name, handler in list(self.handlers.items()):
+            task = asyncio.ensure_future(handler())
+            task.add_done_callback(lambda task, name=name: self._handled(name, task))
+
+    @staticmethod
+    def _handled(name, task):
+        if not task.cancelled() and task.exception() is not None:
+            log.error('recovery handler %s failed', name, exc_info=task.exception())
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.check()
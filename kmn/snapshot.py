@@ -0,0 +1,65 @@
+"""
+Snapshots of the in-process caches, so that restarts don't start out cold.
+
+A snapshot is written on graceful shutdown and read on boot. Snapshots with a different version, or that are too old,
+are ignored.
+"""
+
+import json
+import logging
+import os
+import time
+
+log = logging.getLogger(__name__)
+
+# bump this whenever the shape of any snapshotted cache value changes
+SNAPSHOT_VERSION = 1
+
+
+class Snapshot:
+    def __init__(self, path: str = '_snapshot.json', *, max_age: float = 60 * 60):
+        self.path = path
+        self.max_age = max_age
+
+    def save(self, entries: dict):
+        """Writes ``{cache name: cache.items()}`` to disk. This blocks, so run it in an executor."""
+        data = {'version': SNAPSHOT_VERSION, 'written_at': time.time(), 'caches': entries}
+
+        # write then rename, so that a crash halfway through can't leave a broken snapshot behind
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w') as fp:
+            json.dump(data, fp)
+        os.replace(temporary, self.path)
+
+        log.info('wrote snapshot of %d entries', sum(len(entries) for entries in data['caches'].values()))
+
+    def load(self) -> dict:
+        """Reads the snapshot, returning ``{cache name: [(key, value, ttl)]}``. Anything unusable is skipped."""
+        try:
+            with open(self.path, 'r') as fp:
+                data = json.load(fp)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError):
+            log.exception('failed to read snapshot, ignoring it')
+            return {}
+
+        if data.get('version') != SNAPSHOT_VERSION:
+            log.info('ignoring snapshot with version %s (expected %d)', data.get('version'), SNAPSHOT_VERSION)
+            return {}
+
+        age = time.time() - data['written_at']
+        if age > self.max_age:
+            log.info('ignoring snapshot from %.0fs ago', age)
+            return {}
+
+        # time kept ticking while we were down
+        restored = {}
+        for name, entries in data['caches'].items():
+            restored[name] = [
+                (key, value, None if ttl is None else ttl - age)
+                for key, value, ttl in entries
+                if ttl is None or ttl > age
+            ]
+
+        return restored
@@ -0,0 +1,47 @@
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class StartupTimings:
+    """Times each stage of startup, so that time-to-ready can be measured."""
+
+    def __init__(self, started_at: float = None):
+        self.started_at = time.perf_counter() if started_at is None else started_at
+        self.ready_at = None
+
+        # stage name -> seconds
+        self.stages = OrderedDict()
+        self._open = {}
+
+    def record(self, name: str, seconds: float):
+        self.stages[name] = seconds
+
+    def begin(self, name: str):
+        self._open[name] = time.perf_counter()
+
+    def end(self, name: str):
+        started = self._open.pop(name, None)
+        if started is not None:
+            self.record(name, time.perf_counter() - started)
+
+    @contextmanager
+    def stage(self, name: str):
+        self.begin(name)
+        try:
+            yield
+        finally:
+            self.end(name)
+
+    def ready(self):
+        if self.ready_at is None:
+            self.ready_at = time.perf_counter()
+
+    @property
+    def time_to_ready(self):
+        return None if self.ready_at is None else self.ready_at - self.started_at
+
+    def summary(self) -> str:
+        stages = ', '.join(f'{name} {seconds * 1000:.0f}ms' for name, seconds in self.stages.items())
+        ready = 'not ready' if self.ready_at is None else f'ready in {self.time_to_ready:.2f}s'
+        return f'{ready} ({stages})'
@@ -0,0 +1,194 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextvars import ContextVar
+from itertools import count
+
+log = logging.getLogger(__name__)
+
+# the innermost open span of the current task
+_current_span = ContextVar('kmn_current_span', default=None)
+
+
+class _NullSpan:
+    """Stands in for a span when nothing is being traced, so that untraced code pays (almost) nothing."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def annotate(self, **args):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Trace:
+    """A tree of spans, rooted at a single operation (usually a command invocation)."""
+
+    __slots__ = ('id', 'spans')
+
+    def __init__(self, trace_id: int):
+        self.id = trace_id
+        self.spans = []
+
+
+class Span:
+    __slots__ = ('name', 'category', 'trace', 'args', 'start', 'end', '_token')
+
+    def __init__(self, name: str, category: str, trace: Trace, args: dict):
+        self.name = name
+        self.category = category
+        self.trace = trace
+        self.args = args
+        self.start = self.end = 0
+        self._token = None
+
+    def annotate(self, **args):
+        self.args.update(args)
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.end = time.perf_counter_ns()
+        _current_span.reset(self._token)
+
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+
+        self.trace.spans.append(self)
+
+    @property
+    def duration(self) -> int:
+        """The duration of this span, in nanoseconds."""
+        return self.end - self.start
+
+    def to_event(self) -> dict:
+        """Converts this span into a Chrome trace "complete" event."""
+        return {
+            'name': self.name, 'cat': self.category, 'ph': 'X',
+            'ts': self.start / 1000, 'dur': self.duration / 1000,
+            'pid': os.getpid(), 'tid': self.trace.id,
+            'args': {key: str(value) for key, value in self.args.items()}
+        }
+
+
+class _RootSpan(Span):
+    __slots__ = ('tracer',)
+
+    def __init__(self, tracer, *args):
+        super().__init__(*args)
+        self.tracer = tracer
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        super().__exit__(exc_type, exc_val, exc_tb)
+        self.tracer._finish(self)
+
+
+class Tracer:
+    """Collects nested spans across awaits (through contextvars) and writes sampled traces to a file.
+
+    Traces are written in the Chrome trace-event JSON array format, so the file can be opened directly in
+    ``chrome://tracing`` or Perfetto. A trace is kept if it is randomly sampled or if it was slow.
+    """
+
+    def __init__(self, *, loop, path: str = '_traces.json', sample_rate: float = 0.0, slow_ms: float = None):
+        self.loop = loop
+        self.path = path
+        self.sample_rate = sample_rate
+        self.slow_ns = None if slow_ms is None else int(slow_ms * 1_000_000)
+        self.enabled = sample_rate > 0 or slow_ms is not None
+
+        self.written = 0
+        self._ids = count(1)
+        self._lock = threading.Lock()
+
+    def trace(self, name: str, category: str = 'command', **args):
+        """Opens the root span of a new trace."""
+        if not self.enabled:
+            return NULL_SPAN
+        return _RootSpan(self, name, category, Trace(next(self._ids)), args)
+
+    def span(self, name: str, category: str, **args):
+        """Opens a span under the current one. Does nothing if nothing is being traced."""
+        parent = _current_span.get()
+        if parent is None:
+            return NULL_SPAN
+        return Span(name, category, parent.trace, args)
+
+    @staticmethod
+    def active() -> bool:
+        return _current_span.get() is not None
+
+    async def wrap(self, awaitable, name: str, category: str, **args):
+        """Awaits something inside of a span."""
+        with self.span(name, category, **args):
+            return await awaitable
+
+    def _finish(self, root: _RootSpan):
+        sampled = random.random() < self.sample_rate
+        slow = self.slow_ns is not None and root.duration >= self.slow_ns
+
+        if not sampled and not slow:
+            return
+
+        events = [span.to_event() for span in root.trace.spans]
+        self.loop.run_in_executor(None, self._write, events)
+
+    def _write(self, events):
+        with self._lock:
+            try:
+                fresh = not os.path.exists(self.path)
+                with open(self.path, 'a') as fp:
+                    # the closing bracket is optional in the array format, so we can keep appending forever
+                    if fresh:
+                        fp.write('[\n')
+                    for event in events:
+                        fp.write(json.dumps(event) + ',\n')
+                self.written += 1
+            except OSError:
+                log.exception('failed to write trace')
+
+
+def traced_http(tracer: Tracer, request):
+    """Wraps :meth:`discord.http.HTTPClient.request` so that every Discord API call gets a span."""
+    async def request_wrapper(route, **kwargs):
+        with tracer.span(f'{route.method} {route.path}', 'http'):
+            return await request(route, **kwargs)
+    return request_wrapper
+
+
+def http_trace_config(tracer: Tracer):
+    """Returns an aiohttp ``TraceConfig`` that gives outgoing requests spans, or ``None`` if aiohttp is too old."""
+    try:
+        from aiohttp import TraceConfig
+    except ImportError:
+        return None
+
+    async def on_request_start(session, context, params):
+        span = tracer.span(f'{params.method} {params.url.host}', 'http')
+        context.span = span
+        span.__enter__()
+
+    async def on_request_end(session, context, params):
+        context.span.__exit__(None, None, None)
+
+    async def on_request_exception(session, context, params):
+        context.span.__exit__(type(params.exception), params.exception, None)
+
+    config = TraceConfig()
+    config.on_request_start.append(on_request_start)
+    config.on_request_end.append(on_request_end)
+    config.on_request_exception.append(on_request_exception)
+    return config